@@ -1,15 +1,38 @@
 
-
+import asyncio
 import os
+import time
 from mycroft.skills.core import MycroftSkill, intent_handler
 from mycroft.skills.context import adds_context, removes_context
 from mycroft import intent_file_handler
 from mycroft.util.log import getLogger
 from adapt.intent import IntentBuilder
-import asyncio
-from ourgroceries import OurGroceries
-import datetime
-import json
+from .grocery_core.bulk_operations import crossed_off_items, items_in_category, run_bulk, \
+    move_operation, remove_operation, uncross_operation
+from .grocery_core.cache_daemon import CATEGORIES_KEY, GROCERIES_KEY, LISTS_KEY, \
+    daemon_client_factory
+from .grocery_core.category_resolver import CategoryResolver
+from .grocery_core.instrumentation import Metrics, instrumented
+from .grocery_core.item_index import GroceryIndex, normalize_name
+from .grocery_core.item_segmenter import ItemSegmenter
+from .grocery_core.journal import ADD, UNCROSS, add_record, apply_records, create_category_record, uncross_record
+from .grocery_core.list_directory import ListDirectory
+from .grocery_core.model import load_categories, load_shopping_list
+from .grocery_core.mutation_queue import MutationQueue, ADD_ITEM, UNCROSS_ITEM, CREATE_CATEGORY, CREATE_LIST
+from .grocery_core.request_gate import DEFAULT_RATE
+from .grocery_core.session import GrocerySession
+from .grocery_core.state_cache import StateCache, EXPIRED, FRESH, STALE
+from .grocery_core.sync_engine import SyncEngine, copy_list, merge_list
+from .grocery_core.sync_schedule import SyncSchedule
+
+GROCERY_STATE_FILE = "groceries_%s.txt"
+LIST_DIRECTORY_STATE_FILE = "shopping_lists.txt"
+PENDING_CHANGES_FILE = "pending_changes.txt"
+SYNC_EVENT_NAME = "OurGroceriesBackgroundSync"
+DEFAULT_FETCH_TIMEOUT = 10
+STATS_DUMP_FILE = "grocery_skill_stats.json"
+# Longer category listings are cut short when spoken
+MAX_ITEMS_SPOKEN = 10
 
 
 class OurGroceriesSkill(MycroftSkill):
@@ -20,51 +43,233 @@ class OurGroceriesSkill(MycroftSkill):
         self.list_id = ''
         self.list_name = ''
         self.category = None
-        self.current_time = datetime.datetime.now()
         self.time_heading_in_dict = 'refresh_date'
         self.grocery_state_file = ""
         self.category_state_file = "grocery_categories.txt"
+        self.grocery_index = None
+        # Read model of the current list with per category totals, for the query intents. It is
+        # held next to the cached dicts, only for the one list, and only once it has been asked about
+        self.list_model = None
+        self.list_model_source = None
+        # The categories by id for naming an item's category, converted once per category list
+        self.category_model = None
+        self.category_model_source = None
+        self.ourgroceries_object = None
+        self.category_resolver = None
+        self.list_directory = None
+        # Knows the item names on the user's lists so "peanut butter and ice cream" is two items
+        self.item_segmenter = ItemSegmenter()
+        # Changes are sent to OurGroceries from this queue so a flaky connection can't lose them
+        self.mutation_queue = MutationQueue(PENDING_CHANGES_FILE)
+        self.state_cache = StateCache()
+        # state files with a background refresh in flight
+        self.revalidating = set()
+        # Seconds each fetch may take, and how long the last one of each type did take
+        self.fetch_timeout = DEFAULT_FETCH_TIMEOUT
+        self.fetch_timings = {}
+        # Timings of the intents, cache checks and network calls, cheap enough to leave on
+        self.metrics = Metrics()
+        # One logged in session is shared by every intent instead of logging in each time
+        self.grocery_session = GrocerySession(metrics=self.metrics)
+        # Lists are only downloaded when their version on the server has changed. The
+        # session's gate tells it when the skill has changed a list itself
+        self.sync_engine = SyncEngine(gate=self.grocery_session.gate)
+        # Set when the cache_daemon setting routes the session through the cache daemon
+        self.daemon_factory = None
+
+    def initialize(self):
+        self._apply_cache_settings()
+        self.mutation_queue.limit = int(self.settings.get('max_concurrent_adds', 4))
+        self.mutation_queue.start(self.grocery_session.loop_thread, self._queue_client)
+        self.sync_schedule = SyncSchedule(interval=60 * float(self.settings.get('sync_interval_minutes', 15)))
+        if self.sync_schedule.interval > 0:
+            # Warm the cache shortly after load so the first intent doesn't pay for the downloads
+            self.schedule_event(self.sync_lists, self.sync_schedule.first_delay(), name=SYNC_EVENT_NAME)
+
+    @instrumented("sync.background")
+    def sync_lists(self, message=None):
+        """
+        Scheduled event which downloads the categories, the list directory and every shopping
+        list the skill has a state file for, then schedules itself again. Failed syncs back off
+        :param message: the Mycroft message for the scheduled event (unused)
+        :return: None
+        """
+        if not self.settings.get('user_name') and not self.settings.get('cache_daemon'):
+            self.log.info("No OurGroceries credentials yet, skipping background sync")
+            succeeded = False
+        else:
+            try:
+                self._create_initial_grocery_connection()
+                succeeded = self.prefetch_lists()
+                # Anything left from a previous run or an outage can go now that there is a session
+                self.mutation_queue.wake()
+            except Exception as error:
+                self.log.warning("Background sync failed: %s" % error)
+                succeeded = False
+        if self.sync_schedule.interval > 0:
+            self.schedule_event(self.sync_lists, self.sync_schedule.next_delay(succeeded), name=SYNC_EVENT_NAME)
+
+    def _active_list_ids(self):
+        """
+        The lists worth keeping warm are the ones that have been used before, which are
+        the ones with a state file
+        :return: (set) shopping list ids
+        """
+        prefix, suffix = GROCERY_STATE_FILE.split("%s")
+        list_ids = {file_name[len(prefix):-len(suffix)] for file_name in os.listdir(".")
+                    if file_name.startswith(prefix) and file_name.endswith(suffix)}
+        if self.list_id:
+            list_ids.add(self.list_id)
+        return list_ids
 
+    @instrumented("sync.prefetch")
+    def prefetch_lists(self):
+        """
+        Downloads the categories, the list directory and all active lists at the same time
+        and saves them to the cache
+        :return: (bool) True if everything was refreshed
+        """
+        list_ids = sorted(self._active_list_ids())
+        state_files = [(self.category_state_file, "categories"), (LIST_DIRECTORY_STATE_FILE, "lists")]
+        # Each fetch has its own timeout, as in check_files_age, so one slow list can't hold up the rest
+        requests = [self._timed_fetch("categories", self._fetch_coroutine("categories")),
+                    self._timed_fetch("lists", self._fetch_coroutine("lists"))]
+        for list_id in list_ids:
+            state_file = GROCERY_STATE_FILE % list_id
+            state_files.append((state_file, "groceries"))
+            cached = self.state_cache.load(state_file, "groceries")
+            # An intent may be using the cached list, so it is never merged into here
+            fetch = self._fetch_coroutine("groceries", list_id=list_id, cached=cached, in_place=False)
+            requests.append(self._timed_fetch("groceries", fetch))
+        results = self.grocery_session.run_all(requests, return_exceptions=True)
+        succeeded = True
+        for (state_file, object_type), fetched in zip(state_files, results):
+            if isinstance(fetched, Exception):
+                self.log.warning("Could not prefetch %s: %s" % (state_file, fetched))
+                succeeded = False
+                continue
+            full_list = self._store_fetched_list(state_file, object_type, fetched)
+            if object_type == "groceries" and full_list is not None:
+                self.item_segmenter.learn_list(full_list)
+        self.log.info("Prefetched categories and %s shopping lists %s" % (len(list_ids), self.sync_engine.stats()))
+        return succeeded
+
+    def _apply_cache_settings(self):
+        """
+        Reads how long each cached list stays fresh and how much memory the cache may use
+        :return: None
+        """
+        self.state_cache.ttl_seconds['groceries'] = 60 * float(self.settings.get('grocery_cache_minutes', 10))
+        self.state_cache.ttl_seconds['categories'] = 60 * float(self.settings.get('category_cache_minutes', 10))
+        self.state_cache.ttl_seconds['lists'] = 60 * float(self.settings.get('list_directory_cache_minutes', 60))
+        self.state_cache.max_bytes = 1024 * int(self.settings.get('cache_memory_limit_kb', 4096))
+        self.state_cache.stale_seconds = 60 * float(self.settings.get('serve_stale_minutes', 20))
+        self.state_cache.compress = bool(self.settings.get('compress_state_files', True))
+        self.fetch_timeout = float(self.settings.get('fetch_timeout_seconds', DEFAULT_FETCH_TIMEOUT))
+        self.grocery_session.gate.rate = float(self.settings.get('max_requests_per_second', DEFAULT_RATE))
+        daemon_address = self.settings.get('cache_daemon')
+        if daemon_address and self.grocery_session.client is None:
+            # The daemon logs in and downloads for every skill on the machine
+            self.daemon_factory = daemon_client_factory(daemon_address, self._on_daemon_invalidate)
+            self.grocery_session.client_factory = self.daemon_factory
+
+    @instrumented("session.connect")
     def _create_initial_grocery_connection(self):
         """
         This gets the username/password from the config file and gets the session cookie
-        for any interactions
+        for any interactions. The session is kept between intents so only the first intent
+        (or a change in credentials) causes a login
         :return: None
         """
         self.username = self.settings.get('user_name')
         self.password = self.settings.get('password')
-        self.ourgroceries_object = OurGroceries(self.username, self.password)
-        asyncio.run(self.ourgroceries_object.login())
+        try:
+            self.ourgroceries_object = self.grocery_session.connect(self.username, self.password,
+                                                                   timeout=self.fetch_timeout)
+        except OSError as error:
+            if self.daemon_factory is None or self.grocery_session.client_factory is not self.daemon_factory:
+                raise
+            self.log.warning("Could not reach the cache daemon, talking to OurGroceries directly: %s" % error)
+            self.grocery_session.client_factory = None
+            self.ourgroceries_object = self.grocery_session.connect(self.username, self.password,
+                                                                   timeout=self.fetch_timeout)
+        # Changes left over from before there was a session can go now
+        self.mutation_queue.wake()
+        self.log.info("OurGroceries session stats: %s" % self.grocery_session.stats())
+
+    def _connected_client(self):
+        """
+        Logs in the first time a request has to go to OurGroceries. Intents answered from
+        the cache and changes that are queued never wait on a login
+        :return: PooledOurGroceries, or DaemonClient with the cache_daemon setting
+        """
+        if self.ourgroceries_object is None:
+            self._create_initial_grocery_connection()
+        return self.ourgroceries_object
 
+    def _queue_client(self):
+        """
+        Hands the mutation queue a logged in client, logging in if there is something to
+        send and no intent has needed OurGroceries yet. Called off the event loop
+        :return: the client, or None if OurGroceries can't be reached yet
+        """
+        try:
+            return self._connected_client()
+        except Exception as error:
+            self.log.warning("Could not log in to send the queued changes: %s" % error)
+            return None
+
+    def _on_daemon_invalidate(self, keys):
+        """
+        Called by the cache daemon when another skill changed something, so the copies
+        here are marked out of date and the next intent gets the new ones from the daemon.
+        They are kept, so there is still an answer if the daemon can't be reached then
+        :param keys: (list) the daemon's keys for the lists that changed, None for everything
+        :return: None
+        """
+        if keys is None:
+            keys = [LISTS_KEY, CATEGORIES_KEY] + [GROCERIES_KEY % list_id for list_id in self._active_list_ids()]
+        # Every change moves the versions in the overview
+        self.sync_engine.forget_overview()
+        for key in keys:
+            if key == LISTS_KEY:
+                self.state_cache.expire(LIST_DIRECTORY_STATE_FILE, "lists")
+            elif key == CATEGORIES_KEY:
+                self.state_cache.expire(self.category_state_file, "categories")
+            elif key.startswith(GROCERIES_KEY % ""):
+                self.state_cache.expire(GROCERY_STATE_FILE % key[len(GROCERIES_KEY % ""):], "groceries")
+        self.log.debug("Cache daemon invalidated %s" % keys)
+
+    @instrumented("lookup.list_id")
     def determine_list_id(self, list_string):
         """
         This is used to determine the list id used to add items to the correct list
         It attempts to handle common scenarios of mis-named lists. For example
         the list might be called "Groceries" but the user may say "Groceries list".
-        It tries to find an exact match and if that fails, find a match by splitting off
-        the word "list" from the utterance captured by Mycroft
+        The names come from the cached list directory. If the name is not found there
+        the directory is downloaded again in case the list was created somewhere else
         :param list_string:
         :return: list_id  alpha numeric string that corresponds with the OurGroceries ID
         """
-        list_id = None
-        # Just to be safe we are going to lower the utterance that has been passed in
-        lowered_list = list_string.lower()
-        # Go get a current list from the servers
-        temp_list = asyncio.run(self.ourgroceries_object.get_my_lists())
-        # The server identifies all lists in under the key "shoppingLists"
-        for shopping_list in temp_list['shoppingLists']:
-            if lowered_list == shopping_list['name'].lower():
-                list_id = shopping_list['id']
-                break
-            else:
-                if "list" in lowered_list.split():
-                    # Split the string and remove the list word. Strip the output to remove any trailing spaces
-                    list_string_without_list_word = " ".join(lowered_list.split("list")[:-1]).strip()
-                    if list_string_without_list_word == shopping_list['name'].lower():
-                        list_id = shopping_list['id']
-                        break
+        list_id = self._get_list_directory().find(list_string)
+        if list_id is None:
+            list_id = self._get_list_directory(override=True).find(list_string)
         return list_id
 
+    def _get_list_directory(self, override=None):
+        """
+        Returns the index of shopping list names, which is cached with its own TTL
+        :param override: (bool) download the directory regardless of its age
+        :return: ListDirectory
+        """
+        if override:
+            self.state_cache.expire(LIST_DIRECTORY_STATE_FILE, "lists")
+            self.sync_engine.forget_overview()
+        my_lists = self.check_file_age(LIST_DIRECTORY_STATE_FILE, self.state_cache.now(), object_type="lists")
+        if self.list_directory is None or not self.list_directory.is_for(my_lists):
+            self.list_directory = ListDirectory(my_lists)
+        return self.list_directory
+
     def determine_category_name(self, message_data):
         """
         This function determines the category name. Since the Padatious intent passes all
@@ -77,6 +282,7 @@ class OurGroceriesSkill(MycroftSkill):
             # Category is optional so this is a non-fatal error
             self.category = message_data.get("category")
 
+    @instrumented("add.item")
     def add_to_my_list(self, full_list, item_name, all_categories, item_category="None"):
         """
         This deals with adding items to the active list. This means that objects that
@@ -91,63 +297,130 @@ class OurGroceriesSkill(MycroftSkill):
         :param item_category: (string) This is the category to add a new item to
         :return: Nothing
         """
-        # check to make sure the object doesn't exist
-        # The groceries live in my_full_list['list']['items']
-        # Start with the assumption that the food does not exist
-        food_exists = False
-        move_food_between_categories = False
-        toggle_crossed_off = False
+        category_id = self.return_category_id(self._lower_category(item_category), all_categories)
+        action, existing_item_id = self._plan_item_add(full_list, item_name, category_id)
+        if action == "add":
+            self.mutation_queue.enqueue(self.list_id, ADD_ITEM, value=item_name, category_id=category_id)
+            self.log.info("-----> Added item <------")
+            self._get_index(full_list).record_added(item_name, category_id)
+            self._journal_changes(full_list, [add_record(item_name, category_id)])
+        elif action == "uncross":
+            self.mutation_queue.enqueue(self.list_id, UNCROSS_ITEM, value=item_name, item_id=existing_item_id)
+            self._get_index(full_list).record_uncrossed(item_name)
+            self._journal_changes(full_list, [uncross_record(item_name)])
+
+    def _journal_changes(self, full_list, records):
+        """
+        Saves changes already made to the cached list by appending them to its journal
+        rather than rewriting the whole state file
+        :param full_list: (dict) the cached list, already changed
+        :param records: (list) journal records describing the changes
+        :return: None
+        """
+        self.state_cache.append(self.grocery_state_file, "groceries", full_list, records)
+        for record in records:
+            if record['op'] == ADD:
+                self.item_segmenter.learn(record['value'])
+        if self.list_model is not None and self.list_model_source is full_list:
+            # Keep the query totals in step without rebuilding them
+            for record in records:
+                if record['op'] == ADD:
+                    self.list_model.record_added(record['value'], record.get('categoryId'))
+                elif record['op'] == UNCROSS:
+                    self.list_model.record_uncrossed(record['value'])
+
+    @instrumented("add.items")
+    def add_multiple_to_my_list(self, full_list, item_names, all_categories, item_category="None"):
+        """
+        Adds several items at once. Every item is checked against the cached list up front,
+        the changes are put on the outbound queue, which sends them to OurGroceries
+        concurrently (bounded by the max_concurrent_adds setting), and they are journaled
+        in a single write at the end
+        :param full_list: (dict) the list received from OurGroceries (dict)
+        :param item_names: (list) the names of the items to be added to the list
+        :param all_categories: (dict) all the categories currently defined at OurGroceries
+        :param item_category: (string) This is the category to add the new items to
+        :return: (tuple) the items that were added and the items that failed
+        """
+        category_id = self.return_category_id(self._lower_category(item_category), all_categories)
+        # Items already active in the right category need no request but still count as added
+        planned = []
+        changes = []
+        seen = set()
+        for item_name in item_names:
+            # Saying an item twice in one go should only add it once
+            if normalize_name(item_name) in seen:
+                continue
+            seen.add(normalize_name(item_name))
+            action, existing_item_id = self._plan_item_add(full_list, item_name, category_id)
+            if action == "add":
+                changes.append((self.list_id, ADD_ITEM, {'value': item_name, 'category_id': category_id}))
+            elif action == "uncross":
+                changes.append((self.list_id, UNCROSS_ITEM, {'value': item_name, 'item_id': existing_item_id}))
+            planned.append((item_name, action))
+        try:
+            # One write of the queue file for the whole batch
+            self.mutation_queue.enqueue_many(changes)
+        except OSError as error:
+            # The queue could not be saved, so the changes would be lost
+            self.log.error("Could not add %s: %s" % (self._join_items([name for name, _ in planned]), error))
+            return [], [name for name, _ in planned]
+        added = []
+        records = []
+        for item_name, action in planned:
+            if action == "add":
+                self._get_index(full_list).record_added(item_name, category_id)
+                records.append(add_record(item_name, category_id))
+            elif action == "uncross":
+                self._get_index(full_list).record_uncrossed(item_name)
+                records.append(uncross_record(item_name))
+            added.append(item_name)
+        self._journal_changes(full_list, records)
+        return added, []
+
+    @staticmethod
+    def _lower_category(item_category):
         if item_category:
-            category_lowered = item_category.lower()
-        else:
-            category_lowered = item_category
-        category_id = self.return_category_id(category_lowered, all_categories)
+            return item_category.lower()
+        return item_category
+
+    def _get_index(self, full_list):
+        """
+        Returns the name index for the cached list, only building it when the list
+        has been loaded or refreshed since the last time
+        :param full_list: (dict) the list received from OurGroceries
+        :return: GroceryIndex
+        """
+        if self.grocery_index is None or not self.grocery_index.is_for(full_list):
+            self.grocery_index = GroceryIndex(full_list)
+        return self.grocery_index
+
+    def _plan_item_add(self, full_list, item_name, category_id):
+        """
+        Works out what needs to happen on the server for an item to be on the list
+        :param full_list: (dict) the list received from OurGroceries (dict)
+        :param item_name: (string) the name of the item to be added to the list
+        :param category_id: (string) the id of the category the item should be in
+        :return: (tuple) "add", "uncross" or None followed by the id of the existing item
+        """
         # basic structure is {'list':{'items':['id': '','value':'','categoryId':'']}}
-        for food_item in full_list['list']['items']:
-            if item_name in food_item['value']:
-                # if the food exists check to see if it is in category the user requested
-                try:
-                    if category_id == food_item['categoryId']:
-                        self.log.info("-----> Already exists in Category")
-                        food_exists = True
-                    else:
-                        move_food_between_categories = True
-                except KeyError:
-                    # KeyError is likely to happen when an item is uncategorized so assume we should move it
-                    self.log.info("---------> Item already exists")
-                    move_food_between_categories = True
-                    pass
-                try:
-                    # It is possible that the food exists in the list but its just crossed off
-                    # assume that the user wants to toggle it back to the main list
-                    if food_item['crossedOff']:
-                        self.log.info("Returning crossed off item to list")
-                        existing_item_id = food_item['id']
-                        toggle_crossed_off = True
-                except KeyError:
-                    pass
-        if not food_exists or move_food_between_categories:
-            asyncio.run(self.ourgroceries_object.add_item_to_list(self.list_id, item_name, category_id))
-            self.log.info("-----> Added item <------")
-            # update local dict so we dont have to refresh it
-            index = 0
-            item_in_file = False
-            for item in full_list['list']['items']:
-                if item_name in item['value']:
-                    # NOTE this is no longer a valid backup item because the id of the new object
-                    # was not retrieved from the server. This is simply to make sure we dont add duplicates
-                    # We are trying to avoid excessive calls to the ourgroceries servers
-                    full_list['list']['items'][index] = {'value': item_name, 'categoryId': category_id}
-                    item_in_file = True
-                index += 1
-            if not item_in_file:
-                full_list['list']['items'].append({'value': item_name, 'categoryId': category_id})
-            self.write_new_list_to_disk(self.grocery_state_file, full_list)
-        else:
-            if toggle_crossed_off:
-                asyncio.run(self.ourgroceries_object.toggle_item_crossed_off(self.list_id, existing_item_id,
-                                                                             cross_off=False))
+        food_item = self._get_index(full_list).find(item_name)
+        if food_item is None:
+            return "add", None
+        # if the food exists check to see if it is in category the user requested
+        # a missing categoryId means the item is uncategorized so assume we should move it
+        if category_id != food_item.get('categoryId'):
+            self.log.info("---------> Item already exists in another category")
+            return "add", None
+        self.log.info("-----> Already exists in Category")
+        # It is possible that the food exists in the list but its just crossed off
+        # assume that the user wants to toggle it back to the main list
+        if food_item.get('crossedOff'):
+            self.log.info("Returning crossed off item to list")
+            return "uncross", food_item['id']
+        return None, None
 
+    @instrumented("add.category")
     def add_category(self, category_name, all_categories):
         """
         This runs the asyncio command to create a new category
@@ -155,64 +428,235 @@ class OurGroceriesSkill(MycroftSkill):
         :param all_categories: (dict) the list of all categories
         :return: nothing
         """
-        category_id = self.return_category_id(category_name, all_categories)
+        # A near miss is a different category when the user is asking to create one
+        category_id = self.return_category_id(category_name, all_categories, fuzzy=False)
         if category_id is None:
-            asyncio.run(self.ourgroceries_object.create_category(category_name))
-            self.refresh_lists()
+            try:
+                response = self.grocery_session.run(self._connected_client().create_category(category_name),
+                                                    self.fetch_timeout)
+            except Exception as error:
+                # Send it later rather than losing the request
+                self.log.warning("Queueing category %s: %s" % (category_name, error))
+                self.mutation_queue.enqueue(None, CREATE_CATEGORY, value=category_name)
+                return
             self.log.info("Added Category")
+            self._record_new_category(category_name, response)
         else:
             self.log.info("Category already exists")
 
+    def _record_new_category(self, category_name, response):
+        """
+        Adds a category the skill just created to the cached categories through the journal
+        so the next intent can use it without downloading the categories again
+        :param category_name: (string) the category that was created
+        :param response: (dict) the OurGroceries response to creating it
+        :return: None
+        """
+        category_id = response.get('itemId') if isinstance(response, dict) else None
+        if category_id is None:
+            # Without the new id the cached copy can't be patched, download it next time
+            self.state_cache.expire(self.category_state_file, "categories")
+            return
+        all_categories = self.state_cache.load(self.category_state_file, "categories")
+        if all_categories is None:
+            return
+        records = [create_category_record(category_name, category_id)]
+        apply_records(all_categories, records)
+        self.state_cache.append(self.category_state_file, "categories", all_categories, records)
+        # The categories were changed in place so the resolver has to be rebuilt
+        self.category_resolver = None
+
     def check_file_age(self, state_file, current_timestamp, object_type=None):
         """
-        This checks a state file on dist for a time stamp. If the timestamp in the file
-        is older than minutes_since_last_refresh, a new copy is fetched from OutGroceries
+        This checks a state file on disk for a time stamp. If the list is older than the
+        cache TTL for its type, a new copy is fetched from OurGroceries. A list that is only
+        slightly past its TTL is returned straight away and refreshed in the background so
+        the voice response never waits on the download. The parsed file is held in memory
+        and only read again if another process changes it
         :param state_file: (string) the state file is either the category dict or the grocery item dict
         :param current_timestamp: (timestamp) the current time/date converted to a time stamp
         :param object_type: (string) either groceries or categories
         :return: the current list retrieved from OurGroceries
         """
-        # make sure the file exists before trying to load it
-        if os.path.isfile(state_file):
-            temp_list = json.load(open(state_file))
+        full_list = self.check_files_age([(state_file, object_type)], current_timestamp)[0]
+        if isinstance(full_list, BaseException):
+            raise full_list
+        return full_list
+
+    @instrumented("cache.check_age")
+    def check_files_age(self, state_files, current_timestamp, force=False):
+        """
+        Does the age check of check_file_age for several state files at once. Every list
+        that has to be downloaded is fetched at the same time, each under its own timeout,
+        so one slow request doesn't hold up the others. A list that can't be fetched falls
+        back to its cached copy
+        :param state_files: (list) (state_file, object_type) tuples
+        :param current_timestamp: (timestamp) the current time/date converted to a time stamp
+        :param force: (bool) fetch every list regardless of its age
+        :return: (list) the lists in the same order, or the exception for a list that
+                 could not be fetched and has no cached copy
+        """
+        results = []
+        to_fetch = []
+        for state_file, object_type in state_files:
+            full_list = self.state_cache.load(state_file, object_type)
+            results.append(full_list)
+            if full_list is not None and not force:
+                freshness = self.state_cache.freshness(full_list, object_type, current_timestamp)
+                self.metrics.count("cache.%s" % freshness)
+                if freshness == FRESH:
+                    self.log.info("%s list is fresh... skipping refresh" % object_type)
+                    continue
+                if freshness == STALE:
+                    self.log.info("Serving stale %s list while it is refreshed in the background" % object_type)
+                    self._revalidate_in_background(state_file, object_type)
+                    continue
+            elif full_list is None:
+                self.metrics.count("cache.missing")
+            self.log.info("Updating %s list as it is missing or older than %s seconds" %
+                          (object_type, self.state_cache.ttl_seconds.get(object_type)))
+            to_fetch.append(len(results) - 1)
+        if not to_fetch:
+            return results
+        try:
+            requests = []
+            for position in to_fetch:
+                object_type = state_files[position][1]
+                fetch = self._fetch_coroutine(object_type, cached=results[position])
+                requests.append(self._timed_fetch(object_type, fetch))
+        except Exception as error:
+            # The login failed, e.g. offline after a restart, so every list falls back alike
+            fetched = [error] * len(to_fetch)
+        else:
+            fetched = self.grocery_session.run_all(requests, return_exceptions=True)
+        for position, fresh_list in zip(to_fetch, fetched):
+            state_file, object_type = state_files[position]
+            if isinstance(fresh_list, BaseException):
+                if results[position] is None:
+                    self.log.warning("Could not fetch the %s list: %r" % (object_type, fresh_list))
+                    results[position] = fresh_list
+                else:
+                    # An old list is better than no answer while OurGroceries can't be reached
+                    self.log.warning("Could not refresh the %s list, using the cached copy: %r" %
+                                     (object_type, fresh_list))
+                continue
+            fresh_list[self.time_heading_in_dict] = current_timestamp
+            self.state_cache.store(state_file, object_type, fresh_list)
+            results[position] = fresh_list
+        self.log.info("Fetch times in seconds: %s" % self.fetch_timings)
+        return results
+
+    async def _timed_fetch(self, object_type, fetch):
+        """
+        Runs one fetch under the fetch timeout and records how long it took
+        :param object_type: (string) groceries, categories or lists
+        :param fetch: the coroutine doing the fetch
+        :return: the fetched list
+        """
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(fetch, self.fetch_timeout)
+        finally:
+            self.fetch_timings[object_type] = round(time.perf_counter() - started, 3)
+
+    def _revalidate_in_background(self, state_file, object_type):
+        """
+        Starts downloading a fresh copy of the list on the event loop and saves it when it
+        arrives. Only one refresh per state file is in flight at a time
+        :param state_file: (string) the state file to update
+        :param object_type: (string) either groceries or categories
+        :return: None
+        """
+        if state_file in self.revalidating:
+            return
+        cached = self.state_cache.load(state_file, object_type)
+        try:
+            # The stale list has just been handed to the intent, so it is never merged into here
+            fetch = self._fetch_coroutine(object_type, cached=cached, in_place=False)
+        except Exception as error:
+            self.log.warning("Background refresh of the %s list failed: %s" % (object_type, error))
+            return
+        self.revalidating.add(state_file)
+        future = self.grocery_session.submit(fetch)
+
+        def store_refreshed_list(done):
+            self.revalidating.discard(state_file)
             try:
-                # check for the time stamp in the dict as this is a value I am adding
-                # ignore a KeyError, because that likely means the file has been
-                # refreshed from OurGroceries
-                last_refresh = temp_list[self.time_heading_in_dict]
-                minutes_since_last_refresh = round((current_timestamp - last_refresh) / 60)
-            except KeyError:
-                pass
-            self.log.info("List is %s minutes old" % minutes_since_last_refresh)
-            if minutes_since_last_refresh > 10:
-                self.log.info("Updating %s list as it is older than 10 minutes" % object_type)
-                full_list = self.fetch_list_and_categories(object_type=object_type)
-                full_list[self.time_heading_in_dict] = current_timestamp
-                self.write_new_list_to_disk(state_file, full_list)
+                fetched = done.result()
+            except Exception as error:
+                self.log.warning("Background refresh of the %s list failed: %s" % (object_type, error))
+                return
+            self._store_fetched_list(state_file, object_type, fetched)
+        future.add_done_callback(store_refreshed_list)
+
+    def _store_fetched_list(self, state_file, object_type, fetched):
+        """
+        Saves a list fetched with in_place=False. A new grocery list is merged into a copy
+        of the cached one, which then takes its place, so the dict (and index) an intent
+        is holding never changes under it
+        :param state_file: (string) the state file to update
+        :param object_type: (string) groceries, categories or lists
+        :param fetched: (dict) the downloaded list, None for a grocery list that had not changed
+        :return: (dict) the list now cached
+        """
+        refreshed_at = self.state_cache.now()
+
+        def refreshed(current):
+            if fetched is None:
+                if current is not None:
+                    # Still the current version, only the time stamp moves
+                    current[self.time_heading_in_dict] = refreshed_at
+                return current
+            if object_type == "groceries" and current is not None and 'list' in current:
+                full_list = copy_list(current)
+                merge_list(full_list, fetched)
             else:
-                self.log.info("%s list under 10 minutes old... skipping refresh" % object_type)
-                full_list = temp_list
-        else:
-            full_list = self.fetch_list_and_categories(object_type=object_type)
-            full_list[self.time_heading_in_dict] = current_timestamp
-            # Write the cached file to disk
-            self.write_new_list_to_disk(state_file, full_list)
-        return full_list
+                full_list = fetched
+            full_list[self.time_heading_in_dict] = refreshed_at
+            return full_list
+        return self.state_cache.update(state_file, object_type, refreshed)
 
-    def fetch_list_and_categories(self, object_type=None):
+    def fetch_list_and_categories(self, object_type=None, cached=None):
         """
         Runs the async command to fetch the most recent lists
         :param object_type: (string) either groveries or category
+        :param cached: (dict) the cached copy of a grocery list, only downloaded again if it changed
         :return: either the grocery or category list
         """
+        fetch = self._fetch_coroutine(object_type, cached=cached)
+        if fetch is None:
+            return None
+        return self.grocery_session.run(fetch)
+
+    def _fetch_coroutine(self, object_type, list_id=None, cached=None, in_place=True):
+        """
+        Builds the request for either list without running it so that several
+        fetches can be handed to the event loop together. Grocery lists go through the
+        sync engine which skips the download when the cached copy is still current
+        :param object_type: (string) groceries, categories or lists
+        :param list_id: (string) the shopping list to fetch, defaults to the current list
+        :param cached: (dict) the cached copy of the grocery list, merged with the new one
+        :param in_place: (bool) merge into cached; otherwise a grocery list comes back as
+                         downloaded, or None when cached is current, see _store_fetched_list
+        :return: coroutine or None
+        """
+        # Queries answered from the cache never need to log in, so it happens here
+        client = self._connected_client()
+        if object_type == "groceries" and not in_place:
+            return self.sync_engine.fetch_changes(client, list_id or self.list_id, cached=cached)
         if object_type == "groceries":
-            list_to_return = asyncio.run(self.ourgroceries_object.get_list_items(list_id=self.list_id))
+            index = self.grocery_index
+            if index is None or not index.is_for(cached):
+                index = None
+            return self.sync_engine.sync_list(client, list_id or self.list_id,
+                                              cached=cached, index=index)
         elif object_type == "categories":
-            list_to_return = asyncio.run(self.ourgroceries_object.get_category_items())
-        else:
-            list_to_return = None
-        return list_to_return
+            return client.get_category_items()
+        elif object_type == "lists":
+            return self.sync_engine.fetch_overview(client)
+        return None
 
+    @instrumented("cache.refresh_lists")
     def refresh_lists(self, override=None, category_state_file=None, category_only=None):
         """
         This is responsible for calling the age check on grocery and category lists
@@ -225,69 +669,45 @@ class OurGroceriesSkill(MycroftSkill):
         # This allows for the tracking of multiple lists
         if category_state_file is None:
             category_state_file = self.category_state_file
-        current_timestamp = self.current_time.timestamp()
-        if override is None:
-            grocery_list = self.check_file_age(self.grocery_state_file, current_timestamp, object_type="groceries")
-            all_categories = self.check_file_age(category_state_file, current_timestamp, object_type="categories")
-        # Skip the age check if the override is passed in
+        # Read the clock on every call, the skill lives far longer than the cache TTL
+        current_timestamp = self.state_cache.now()
+        if category_only:
+            state_files = [(category_state_file, "categories")]
         else:
-            if category_only:
-                grocery_list = None
-                all_categories = self.fetch_list_and_categories(object_type="categories")
-            else:
-                grocery_list = self.fetch_list_and_categories(object_type="groceries")
-                all_categories = self.fetch_list_and_categories(object_type="categories")
+            # The list directory is refreshed alongside so a later list lookup finds it warm
+            state_files = [(category_state_file, "categories"), (self.grocery_state_file, "groceries")]
+            if override is None:
+                state_files.append((LIST_DIRECTORY_STATE_FILE, "lists"))
+        # Skip the age check if the override is passed in
+        results = self.check_files_age(state_files, current_timestamp, force=override is not None)
+        for result in results[:2]:
+            if isinstance(result, BaseException):
+                raise result
+        all_categories = results[0]
+        grocery_list = None if category_only else results[1]
+        if grocery_list is not None and (self.grocery_index is None or not self.grocery_index.is_for(grocery_list)):
+            # Build the name index once per load so lookups while adding items are a dict hit.
+            # A list merged by the sync engine is the same dict and its index was kept up to date
+            self.grocery_index = GroceryIndex(grocery_list)
+        if grocery_list is not None:
+            self.item_segmenter.learn_list(grocery_list)
         return grocery_list, all_categories
 
-    @staticmethod
-    def return_category_id(category_to_search_for, all_categories):
+    def return_category_id(self, category_to_search_for, all_categories, fuzzy=True):
         """
         This gets the category_id. The category is passed in as a string and needs to
-        be converted into an ID. In addition this function attempts to guess at common
+        be converted into an ID. In addition this attempts to guess at common
         plural endings assuming that if a plural group exists we should add the object
-        there
+        there, and falls back to the closest heading for misheard categories
         :param category_to_search_for: this is a string
         :param all_categories: a dict of all the categories
+        :param fuzzy: (bool) allow a close but not exact match
         :return: category id
         """
-        try:
-            category_to_search_for_lower = category_to_search_for.lower()
-        except AttributeError:
-            category_to_search_for_lower = category_to_search_for
-        category_id = None
-        if len(all_categories['list']['items']) is not 0:
-            for category_heading in all_categories['list']['items']:
-                # Split the heading because if there is already a duplicate it
-                # presents as "{{item}} (2)"
-                category_heading_lowered = category_heading['value'].lower().split()[0]
-                if category_to_search_for_lower is not None:
-                    if category_to_search_for_lower == category_heading_lowered:
-                        category_id = category_heading['id']
-                        break
-                    # attempt to compensate for plurals in categories
-                    elif category_to_search_for_lower + 's' == category_heading_lowered:
-                        category_id = category_heading['id']
-                        break
-                    elif category_to_search_for_lower + 'ies' == category_heading_lowered:
-                        category_id = category_heading['id']
-                        break
-                    # If we assume that the last character is a plural 'S', slice it off
-                    # and check to see if the heading is the same
-                    elif category_to_search_for_lower[:-1] == category_heading_lowered:
-                        category_id = category_heading['id']
-                        break
-                    # Assume the last 3 characters are 'ies' and remove them
-                    elif category_to_search_for_lower[:-3] == category_heading_lowered:
-                        category_id = category_heading['id']
-                        break
-                else:
-                    category_id = category_to_search_for
-        return category_id
-
-    @staticmethod
-    def write_new_list_to_disk(state_file, new_list):
-        with open(state_file, 'w') as f:
-            json.dump(new_list, f)
+        if self.category_resolver is None or not self.category_resolver.is_for(all_categories):
+            # Only built once each time the categories are loaded
+            self.category_resolver = CategoryResolver(all_categories)
+        return self.category_resolver.resolve(category_to_search_for, fuzzy=fuzzy)
 
     def check_shopping_list_exists(self, message_data):
         """
@@ -305,7 +725,7 @@ class OurGroceriesSkill(MycroftSkill):
             if self.list_id is None:
                 self.speak("Sorry the %s list does not exist" % self.list_name)
                 exit()
-            self.grocery_state_file = "groceries_%s.txt" % self.list_id
+            self.grocery_state_file = GROCERY_STATE_FILE % self.list_id
         except KeyError:
             # If there is a key error, its most likely to be on the shopping list name
             # The shopping list name is required to find the list_id
@@ -314,33 +734,44 @@ class OurGroceriesSkill(MycroftSkill):
             exit()
 
     @intent_file_handler("create.multiple.items.intent")
+    @instrumented("intent.create_multiple_items")
     def create_multiple_item_on_list(self, message):
         """
         This function handles multiple items being added to the list
         :param message: This is the data including utterance from Mycroft
         :return: Nothing
         """
-        self._create_initial_grocery_connection()
         self.check_shopping_list_exists(message.data)
         self.determine_category_name(message.data)
         shopping_list_dict, categories = self.refresh_lists()
         response = self.get_response("Ok what would you like to add")
         if response is None:
             exit()
-        for item_to_add in response.split():
-            # Ignore the word 'and' in an utterance
-            if item_to_add == "and":
-                continue
-            try:
-                self.add_to_my_list(full_list=shopping_list_dict, item_name=item_to_add, all_categories=categories,
-                                    item_category=self.category)
-                self.speak("Adding %s to your list" % item_to_add)
-            except:
-                # This is a generic catchall which should exit instead of throwing the mycroft error
-                self.speak("Sorry, I couldn't add %s to %s list" % (item_to_add, self.list_name))
-                exit()
+        # Names already seen on a list stay together, words like 'and' between items are dropped
+        items_to_add = self.item_segmenter.segment(response)
+        if not items_to_add:
+            self.speak("Sorry, I didn't hear any items to add to your %s list" % self.list_name)
+            return
+        added, failed = self.add_multiple_to_my_list(full_list=shopping_list_dict, item_names=items_to_add,
+                                                     all_categories=categories, item_category=self.category)
+        if added:
+            self.speak("Adding %s to your list" % self._join_items(added))
+        if failed:
+            self.speak("Sorry, I couldn't add %s to %s list" % (self._join_items(failed), self.list_name))
+
+    @staticmethod
+    def _join_items(items):
+        """
+        Turns ['eggs', 'milk', 'bread'] into "eggs, milk and bread" for speaking
+        :param items: (list) item names
+        :return: (string)
+        """
+        if len(items) == 1:
+            return items[0]
+        return "%s and %s" % (", ".join(items[:-1]), items[-1])
 
     @intent_file_handler("create.item.intent")
+    @instrumented("intent.create_item")
     def create_item_on_list(self, message):
         """
         This function adds an item to the specified list
@@ -349,7 +780,6 @@ class OurGroceriesSkill(MycroftSkill):
         :return:
         """
         item_to_add = message.data.get('food')
-        self._create_initial_grocery_connection()
 
         self.check_shopping_list_exists(message.data)
         self.determine_category_name(message.data)
@@ -364,20 +794,299 @@ class OurGroceriesSkill(MycroftSkill):
             exit()
 
     @intent_file_handler("create.category.intent")
+    @instrumented("intent.create_category")
     def create_category(self, message):
         """
         This creates the category when invoked by the user
         :param message: includes utterance passed from Mycroft
         :return:
         """
-        self._create_initial_grocery_connection()
         user_entered_category = message.data.get('category')
         self.speak("Adding the category %s to your list" % user_entered_category)
-        shopping_list, categories = self.refresh_lists(override=True, category_only=True)
+        try:
+            shopping_list, categories = self.refresh_lists(override=True, category_only=True)
+        except Exception as error:
+            # Check against the cached categories while OurGroceries can't be reached
+            self.log.warning("Could not download the categories: %s" % error)
+            categories = self.state_cache.load(self.category_state_file, "categories") or {'list': {'items': []}}
         self.add_category(user_entered_category, categories)
 
+    @intent_file_handler("uncross.all.items.intent")
+    @instrumented("intent.uncross_all_items")
+    def uncross_all_items(self, message):
+        """
+        Puts every crossed off item back on the list, e.g. to start the weekly shop again
+        :param message: includes utterance passed from Mycroft
+        :return: Nothing
+        """
+        self.check_shopping_list_exists(message.data)
+        shopping_list_dict, categories = self.refresh_lists()
+        items = crossed_off_items(shopping_list_dict)
+        if not items:
+            self.speak("Nothing is crossed off your %s list" % self.list_name)
+            return
+        self.speak("Putting %s items back on your list" % len(items))
+
+        def uncross(succeeded):
+            for item in succeeded:
+                item['crossedOff'] = False
+        result = self.run_bulk_operation(shopping_list_dict, items,
+                                         uncross_operation(self._connected_client(), self.list_id), uncross)
+        self._speak_bulk_failures(result)
+
+    @intent_file_handler("clear.crossed.off.items.intent")
+    @instrumented("intent.clear_crossed_off_items")
+    def clear_crossed_off_items(self, message):
+        """
+        Deletes every crossed off item from the list
+        :param message: includes utterance passed from Mycroft
+        :return: Nothing
+        """
+        self.check_shopping_list_exists(message.data)
+        shopping_list_dict, categories = self.refresh_lists()
+        items = crossed_off_items(shopping_list_dict)
+        if not items:
+            self.speak("Nothing is crossed off your %s list" % self.list_name)
+            return
+        self.speak("Removing %s crossed off items from your list" % len(items))
+
+        def remove(succeeded):
+            removed_ids = {item['id'] for item in succeeded}
+            all_items = shopping_list_dict['list']['items']
+            all_items[:] = [item for item in all_items if item.get('id') not in removed_ids]
+        result = self.run_bulk_operation(shopping_list_dict, items,
+                                         remove_operation(self._connected_client(), self.list_id), remove)
+        self._speak_bulk_failures(result)
+
+    @intent_file_handler("move.category.items.intent")
+    @instrumented("intent.move_category_items")
+    def move_category_items(self, message):
+        """
+        Moves every item in one category to another, e.g. "move all snacks to pantry"
+        :param message: includes utterance passed from Mycroft
+        :return: Nothing
+        """
+        self.check_shopping_list_exists(message.data)
+        source_category = message.data.get('source')
+        self.determine_category_name(message.data)
+        shopping_list_dict, categories = self.refresh_lists()
+        # Every item is moved without asking, so a misheard name must not match a similar category
+        source_id = self.return_category_id(source_category.lower(), categories, fuzzy=False)
+        target_id = self.return_category_id(self.category.lower(), categories, fuzzy=False)
+        for category_name, category_id in ((source_category, source_id), (self.category, target_id)):
+            if category_id is None:
+                self.speak("Sorry, I couldn't find the category %s" % category_name)
+                return
+        items = items_in_category(shopping_list_dict, source_id)
+        if not items:
+            self.speak("There is nothing under %s on your %s list" % (source_category, self.list_name))
+            return
+        self.speak("Moving %s items to %s" % (len(items), self.category))
+
+        def move(succeeded):
+            for item in succeeded:
+                item['categoryId'] = target_id
+        result = self.run_bulk_operation(shopping_list_dict, items,
+                                         move_operation(self._connected_client(), self.list_id, target_id), move)
+        self._speak_bulk_failures(result)
+
+    @instrumented("bulk.run")
+    def run_bulk_operation(self, full_list, items, operation, apply_change):
+        """
+        Sends one change for many items to OurGroceries, a few at a time, then updates the
+        cached list once for all the items that went through
+        :param full_list: (dict) the cached list the items belong to
+        :param items: (list) the items to change
+        :param operation: (function) takes an item and returns the coroutine that changes it
+        :param apply_change: (function) makes the same change to the cached copies of the items
+        :return: BulkResult
+        """
+        result = self.grocery_session.run(run_bulk(items, operation, limit=self.mutation_queue.limit,
+                                                   progress=self._log_bulk_progress))
+        if result.succeeded:
+            apply_change(result.succeeded)
+            # The list changed under the query model, it is rebuilt on the next query
+            self.list_model = None
+            # One snapshot write for the whole operation instead of one per item
+            self.state_cache.store(self.grocery_state_file, "groceries", full_list)
+        self.log.info("Bulk operation finished: %s updated, %s failed" % (len(result.succeeded), len(result.failed)))
+        return result
+
+    def _log_bulk_progress(self, done, total):
+        self.log.info("Bulk operation progress: %s of %s items" % (done, total))
+
+    def _speak_bulk_failures(self, result):
+        """
+        Tells the user about the items that could not be changed, if there were any
+        :param result: (BulkResult) the outcome of the bulk operation
+        :return: None
+        """
+        if not result.failed:
+            return
+        names = [item['value'] for item in result.failed]
+        if len(names) > 5:
+            self.speak("Sorry, %s of the %s items could not be updated" % (len(names), result.total))
+        else:
+            self.speak("Sorry, I couldn't update %s" % self._join_items(names))
+
+    def _get_list_model(self, full_list):
+        """
+        Returns the compact model of the cached list. It is only rebuilt when the cached
+        list was replaced, merged with a newer version or changed somewhere else; the
+        skill's own adds update it in _journal_changes
+        :param full_list: (dict) the cached list
+        :return: ShoppingList
+        """
+        model = self.list_model
+        if (model is None or self.list_model_source is not full_list or
+                model.version_id != full_list['list'].get('versionId') or
+                len(model) != len(full_list['list']['items'])):
+            self.list_model = load_shopping_list(full_list)
+            self.list_model_source = full_list
+        return self.list_model
+
+    def _get_category_model(self, all_categories):
+        """
+        Returns the categories by id. They are only converted again when the cached
+        categories were replaced or the skill created a category
+        :param all_categories: (dict) the cached categories
+        :return: (dict) category id -> Category
+        """
+        if (self.category_model is None or self.category_model_source is not all_categories or
+                len(self.category_model) != len(all_categories['list']['items'])):
+            self.category_model = load_categories(all_categories)
+            self.category_model_source = all_categories
+        return self.category_model
+
+    def _query_list(self, message):
+        """
+        Loads the list a query is about. Nothing is downloaded while the cached copy is fresh
+        :param message: includes utterance passed from Mycroft
+        :return: (tuple) the ShoppingList, the categories and a hint about stale data ("" if fresh)
+        """
+        self.check_shopping_list_exists(message.data)
+        shopping_list_dict, categories = self.refresh_lists()
+        return self._get_list_model(shopping_list_dict), categories, self._freshness_hint(shopping_list_dict)
+
+    def _freshness_hint(self, full_list):
+        """
+        :param full_list: (dict) the cached list an answer came from
+        :return: (string) a sentence to add to the answer when the list may be out of date
+        """
+        if self.state_cache.freshness(full_list, "groceries") == FRESH:
+            return ""
+        age = self.state_cache.age(full_list)
+        if age is None:
+            return " This might be out of date."
+        return " This is from %d minutes ago." % max(1, round(age / 60))
+
+    @intent_file_handler("item.on.list.intent")
+    @instrumented("intent.item_on_list")
+    def item_on_list(self, message):
+        """
+        Answers "is milk on my groceries list" from the cached list
+        :param message: includes utterance passed from Mycroft
+        :return: Nothing
+        """
+        item_name = message.data.get('food')
+        shopping_list, categories, hint = self._query_list(message)
+        food_item = shopping_list.find(item_name)
+        if food_item is None:
+            self.speak("No, %s is not on your %s list.%s" % (item_name, self.list_name, hint))
+        elif food_item.crossed_off:
+            self.speak("%s is on your %s list but it is crossed off.%s" % (item_name, self.list_name, hint))
+        else:
+            category = self._get_category_model(categories).get(food_item.category_id)
+            where = " under %s" % category.name if category is not None else ""
+            self.speak("Yes, %s is on your %s list%s.%s" % (item_name, self.list_name, where, hint))
+
+    @intent_file_handler("category.items.intent")
+    @instrumented("intent.category_items")
+    def category_items(self, message):
+        """
+        Answers "what's in produce on my groceries list" from the cached list
+        :param message: includes utterance passed from Mycroft
+        :return: Nothing
+        """
+        self.determine_category_name(message.data)
+        shopping_list, categories, hint = self._query_list(message)
+        category_id = self.return_category_id(self.category.lower(), categories)
+        if category_id is None:
+            self.speak("Sorry, I couldn't find the category %s" % self.category)
+            return
+        # Say the heading that was matched, a misheard category may have found a different one
+        category = self._get_category_model(categories).get(category_id)
+        category_name = category.name if category is not None else self.category
+        names = [food_item.value for food_item in shopping_list.items_in_category(category_id)]
+        if not names:
+            self.speak("There is nothing under %s on your %s list.%s" % (category_name, self.list_name, hint))
+            return
+        if len(names) > MAX_ITEMS_SPOKEN:
+            names = names[:MAX_ITEMS_SPOKEN] + ["%s more" % (len(names) - MAX_ITEMS_SPOKEN)]
+        self.speak("Under %s you have %s.%s" % (category_name, self._join_items(names), hint))
+
+    @intent_file_handler("items.left.intent")
+    @instrumented("intent.items_left")
+    def items_left(self, message):
+        """
+        Answers "how many items are left on my groceries list" from the cached list
+        :param message: includes utterance passed from Mycroft
+        :return: Nothing
+        """
+        shopping_list, categories, hint = self._query_list(message)
+        self.speak("You have %s items left on your %s list.%s" %
+                   (shopping_list.items_left(), self.list_name, hint))
+
+    @intent_file_handler("crossed.off.count.intent")
+    @instrumented("intent.crossed_off_count")
+    def crossed_off_count(self, message):
+        """
+        Answers "how many items are crossed off my groceries list" from the cached list
+        :param message: includes utterance passed from Mycroft
+        :return: Nothing
+        """
+        shopping_list, categories, hint = self._query_list(message)
+        self.speak("%s items are crossed off your %s list.%s" %
+                   (shopping_list.crossed_off_count(), self.list_name, hint))
+
+    @intent_file_handler("skill.stats.intent")
+    def report_stats(self, message):
+        """
+        Gives a short spoken summary of how quickly the skill has been answering and writes
+        all the numbers to grocery_skill_stats.json
+        :param message: includes utterance passed from Mycroft
+        :return: Nothing
+        """
+        report = self.metrics.dump(STATS_DUMP_FILE, extra=self.stats())
+        self.log.info("Wrote the skill statistics to %s" % os.path.abspath(STATS_DUMP_FILE))
+        intents = [stage for name, stage in report['stages'].items() if name.startswith("intent.")]
+        if not intents:
+            self.speak("I haven't handled any grocery requests yet")
+            return
+        count = sum(stage['count'] for stage in intents)
+        mean_ms = sum(stage['mean_ms'] * stage['count'] for stage in intents) / count
+        slowest_ms = max(stage['max_ms'] for stage in intents)
+        totals = report['totals']
+        network_calls = sum(total for name, total in totals.items() if name.startswith("network."))
+        from_cache = totals.get("cache.%s" % FRESH, 0) + totals.get("cache.%s" % STALE, 0)
+        lookups = from_cache + totals.get("cache.%s" % EXPIRED, 0) + totals.get("cache.missing", 0)
+        self.speak("Over the last %s requests I took %d milliseconds on average and %d at most. "
+                   "The cache answered %s of %s lookups and I made %s calls to OurGroceries" %
+                   (count, mean_ms, slowest_ms, from_cache, lookups, network_calls))
+
+    def stats(self):
+        """
+        :return: (dict) the counters kept by the cache, the session and the background sync
+        """
+        return {'cache': self.state_cache.stats(),
+                'session': self.grocery_session.stats(),
+                'sync': self.sync_engine.stats(),
+                'fetch_timings': dict(self.fetch_timings),
+                'pending_changes': len(self.mutation_queue)}
+
     @intent_handler(IntentBuilder('CreateShoppingIntent').require('CreateShoppingListKeyword').require("ListName"))
     @adds_context("CreateAnywaysContext")
+    @instrumented("intent.create_shopping_list")
     def create_shopping_list(self, message):
         """
         This is an context-aware method that searches for shopping lists of similar names
@@ -388,30 +1097,37 @@ class OurGroceriesSkill(MycroftSkill):
         :param message:
         :return:
         """
-        self._create_initial_grocery_connection()
         self.new_shopping_list_name = message.data['ListName'].lower()
-        current_lists = asyncio.run(self.ourgroceries_object.get_my_lists())
-        for current_shopping_list in current_lists['shoppingLists']:
-            try:
-                current_shopping_list = current_shopping_list['name'].lower()
-                if self.new_shopping_list_name in current_shopping_list:
-                    if self.new_shopping_list_name == current_shopping_list:
-                        self.speak("The shopping list %s already exists" % self.new_shopping_list_name )
-                        break
-                    else:
-                        self.speak("I found a similar naming list called %s" % current_shopping_list)
-                        # This hands off to either handle_dont_create_anyways_context or handle_create_anyways_context
-                        # to make a context aware decision
-                        self.speak("Would you like me to add your new list anyways?", expect_response=True)
-                        break
-            except AttributeError:
-                # If there is an attribute error it is most likely that there are no shopping lists
-                # This is a non-fatal error when added a new shopping list
-                pass
+        for current_shopping_list in self._get_list_directory().list_names():
+            if self.new_shopping_list_name in current_shopping_list:
+                if self.new_shopping_list_name == current_shopping_list:
+                    self.speak("The shopping list %s already exists" % self.new_shopping_list_name )
+                    break
+                else:
+                    self.speak("I found a similar naming list called %s" % current_shopping_list)
+                    # This hands off to either handle_dont_create_anyways_context or handle_create_anyways_context
+                    # to make a context aware decision
+                    self.speak("Would you like me to add your new list anyways?", expect_response=True)
+                    break
         # If it gets this far, assume its time to create the list
-        asyncio.run(self.ourgroceries_object.create_list(self.new_shopping_list_name ))
+        self._create_list(self.new_shopping_list_name)
         self.speak_dialog('do.add.response')
 
+    def _create_list(self, list_name):
+        """
+        Creates the shopping list and marks the cached list directory out of date so the new list is found
+        :param list_name: (string) the name of the new list
+        :return: None
+        """
+        try:
+            self.grocery_session.run(self._connected_client().create_list(list_name), self.fetch_timeout)
+        except Exception as error:
+            # Send it later rather than losing the request
+            self.log.warning("Queueing shopping list %s: %s" % (list_name, error))
+            self.mutation_queue.enqueue(None, CREATE_LIST, value=list_name)
+        self.state_cache.expire(LIST_DIRECTORY_STATE_FILE, "lists")
+        self.sync_engine.forget_overview()
+
     @intent_handler(IntentBuilder('DoNotAddIntent').require("NoKeyword").require('CreateAnywaysContext').build())
     @removes_context("CreateAnywayscontext")
     def handle_dont_create_anyways_context(self):
@@ -424,6 +1140,7 @@ class OurGroceriesSkill(MycroftSkill):
 
     @intent_handler(IntentBuilder('AddAnywaysIntent').require("YesKeyword").require('CreateAnywaysContext').build())
     @removes_context("CreateAnywayscontext")
+    @instrumented("intent.create_anyways")
     def handle_create_anyways_context(self):
         """
         If the user wants to create a similarly named list, it is handled here
@@ -431,11 +1148,15 @@ class OurGroceriesSkill(MycroftSkill):
         :return:
         """
         self.speak_dialog('do.add.response')
-        asyncio.run(self.ourgroceries_object.create_list(self.new_shopping_list_name ))
+        self._create_list(self.new_shopping_list_name)
 
     def stop(self):
         pass
 
+    def shutdown(self):
+        self.mutation_queue.stop()
+        self.grocery_session.close()
+
 
 def create_skill():
     return OurGroceriesSkill()
@@ -0,0 +1,76 @@
+"""
+Compares the cost of resolving a category with the original linear scan against the
+precomputed CategoryResolver as the number of categories grows
+"""
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grocery_core.category_resolver import CategoryResolver  # noqa: E402
+
+
+def linear_return_category_id(category_to_search_for, all_categories):
+    """
+    The lookup as it was written before the resolver, kept here as the baseline
+    """
+    category_to_search_for_lower = category_to_search_for.lower()
+    category_id = None
+    for category_heading in all_categories['list']['items']:
+        category_heading_lowered = category_heading['value'].lower().split()[0]
+        if category_to_search_for_lower == category_heading_lowered:
+            category_id = category_heading['id']
+            break
+        elif category_to_search_for_lower + 's' == category_heading_lowered:
+            category_id = category_heading['id']
+            break
+        elif category_to_search_for_lower + 'ies' == category_heading_lowered:
+            category_id = category_heading['id']
+            break
+        elif category_to_search_for_lower[:-1] == category_heading_lowered:
+            category_id = category_heading['id']
+            break
+        elif category_to_search_for_lower[:-3] == category_heading_lowered:
+            category_id = category_heading['id']
+            break
+    return category_id
+
+
+def make_categories(count):
+    generator = random.Random(count)
+    names = ["".join(generator.choice(string.ascii_lowercase) for _ in range(generator.randint(4, 12))) + "ies"
+             for _ in range(count)]
+    return {'list': {'items': [{'id': "cat%s" % number, 'value': name.title()}
+                               for number, name in enumerate(names)]}}
+
+
+def main():
+    lookups = 2000
+    print("%10s %14s %14s %14s %16s %14s" % ("categories", "linear us", "resolver us", "fuzzy us",
+                                             "first letter us", "build ms"))
+    for count in (10, 100, 1000, 5000):
+        all_categories = make_categories(count)
+        # Ask for the last category in its singular form, the worst case for the linear scan
+        last_heading = all_categories['list']['items'][-1]['value'].lower()
+        wanted = last_heading[:-3]
+        misheard = wanted[:2] + wanted[3] + wanted[2] + wanted[4:] + "ies"
+        misheard_first = ("b" if wanted[0] != "b" else "p") + wanted[1:]
+        build = timeit.timeit(lambda: CategoryResolver(all_categories), number=5) / 5
+        resolver = CategoryResolver(all_categories)
+        assert resolver.resolve(wanted) == linear_return_category_id(wanted, all_categories)
+        # The first fuzzy lookup builds the index of close forms, which is not timed
+        assert resolver.resolve(misheard_first) == resolver.resolve(wanted)
+        linear = timeit.timeit(lambda: linear_return_category_id(wanted, all_categories), number=lookups)
+        resolved = timeit.timeit(lambda: resolver.resolve(wanted), number=lookups)
+        fuzzy = timeit.timeit(lambda: resolver.resolve(misheard), number=lookups // 10)
+        first_letter = timeit.timeit(lambda: resolver.resolve(misheard_first), number=lookups // 10)
+        print("%10s %14.2f %14.2f %14.2f %16.2f %14.2f" % (count, linear / lookups * 1e6, resolved / lookups * 1e6,
+                                                           fuzzy / (lookups // 10) * 1e6,
+                                                           first_letter / (lookups // 10) * 1e6, build * 1e3))
+
+
+if __name__ == '__main__':
+    main()
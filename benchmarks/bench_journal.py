@@ -0,0 +1,60 @@
+"""
+Compares saving one added item by rewriting the whole state file (the old behaviour)
+with appending the change to the list's journal, for lists of different sizes
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grocery_core.journal import add_record  # noqa: E402
+from grocery_core.state_cache import StateCache  # noqa: E402
+
+
+def make_list(count):
+    return {'list': {'id': 'bench', 'items': [{'id': "item%s" % number, 'value': "item number %s" % number,
+                                               'categoryId': "cat%s" % (number % 20), 'crossedOff': number % 3 == 0}
+                                              for number in range(count)]},
+            'refresh_date': time.time()}
+
+
+def measure(directory, count, adds, compress):
+    state_file = os.path.join(directory, "groceries_%s_%s.txt" % (count, compress))
+    # Compaction is turned off so every add is measured as an append
+    cache = StateCache(compress=compress, journal_compact_bytes=float('inf'))
+    full_list = make_list(count)
+    cache.store(state_file, "groceries", full_list)
+
+    rewrite_bytes = cache.bytes_written
+    start = time.perf_counter()
+    for number in range(adds):
+        full_list['list']['items'].append({'value': "rewrite %s" % number, 'categoryId': 'cat1'})
+        cache.store(state_file, "groceries", full_list)
+    rewrite_seconds = time.perf_counter() - start
+    rewrite_bytes = cache.bytes_written - rewrite_bytes
+
+    start = time.perf_counter()
+    for number in range(adds):
+        full_list['list']['items'].append({'value': "journal %s" % number, 'categoryId': 'cat1'})
+        cache.append(state_file, "groceries", full_list, [add_record("journal %s" % number, 'cat1')])
+    journal_seconds = time.perf_counter() - start
+    return rewrite_bytes / adds, rewrite_seconds / adds, cache.journal_bytes_written / adds, journal_seconds / adds
+
+
+def main():
+    adds = 20
+    print("%8s %9s %16s %16s %16s %16s" % ("items", "gzip", "rewrite B/add", "rewrite ms/add",
+                                           "journal B/add", "journal ms/add"))
+    with tempfile.TemporaryDirectory() as directory:
+        for count in (100, 1000, 10000):
+            for compress in (False, True):
+                rewrite_bytes, rewrite_seconds, journal_bytes, journal_seconds = measure(directory, count, adds,
+                                                                                          compress)
+                print("%8s %9s %16.0f %16.2f %16.0f %16.2f" % (count, compress, rewrite_bytes, rewrite_seconds * 1000,
+                                                               journal_bytes, journal_seconds * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Compares the memory a shopping list takes as the raw dicts decoded from the OurGroceries
+response (plus their GroceryIndex) with the column based ShoppingList model, and how long
+it takes to count the crossed off items and look items up in each.
+
+The skill caches the dicts and only builds a ShoppingList on top of them for the list
+being asked about, so what it holds for that list is the "skill KB" column, the sum of
+both. The model makes the skill hold more memory, not less
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grocery_core.item_index import GroceryIndex  # noqa: E402
+from grocery_core.model import load_shopping_list  # noqa: E402
+
+
+def make_response(count, seed):
+    """
+    :return: (string) a getList response as the server would send it, as JSON text
+    """
+    randomizer = random.Random(seed)
+    category_ids = ["cat%016x" % randomizer.getrandbits(64) for _ in range(30)]
+    items = []
+    for number in range(count):
+        item = {'id': "item%016x" % randomizer.getrandbits(64), 'value': "item number %s" % number,
+                'categoryId': randomizer.choice(category_ids), 'crossedOff': randomizer.random() < 0.3,
+                # Fields the server sends that the skill never reads
+                'note': "", 'starred': False}
+        items.append(item)
+    return json.dumps({'command': 'getList', 'list': {'id': 'list1', 'name': 'Groceries', 'versionId': 'v1',
+                                                      'notesHtml': '', 'items': items}})
+
+
+def measure_memory(build):
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, current
+
+
+def best_of(repeats, operation):
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        operation()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="100,1000,10000,50000")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print("%8s %14s %14s %14s %16s %16s %14s %14s" % ("items", "dicts KB", "model KB", "skill KB",
+                                                          "dict count ms", "model count ms",
+                                                          "dict find us", "model find us"))
+    for size in [int(size) for size in args.sizes.split(",")]:
+        text = make_response(size, args.seed)
+        full_list, dict_bytes = measure_memory(lambda: json.loads(text))
+        dict_index, index_bytes = measure_memory(lambda: GroceryIndex(full_list))
+        shopping_list, model_bytes = measure_memory(lambda: load_shopping_list(json.loads(text)))
+
+        dict_count = best_of(5, lambda: sum(1 for item in full_list['list']['items'] if item.get('crossedOff')))
+        model_count = best_of(5, shopping_list.crossed_off_count)
+        names = ["item number %s" % number for number in range(0, size, max(1, size // 1000))]
+        dict_find = best_of(5, lambda: [dict_index.find(name) for name in names]) * 1000 / len(names)
+        model_find = best_of(5, lambda: [shopping_list.find(name) for name in names]) * 1000 / len(names)
+
+        # The dict representation needs its name index as well to answer the same lookups
+        dict_total = dict_bytes + index_bytes
+        print("%8s %14.1f %14.1f %14.1f %16.3f %16.3f %14.2f %14.2f" % (
+            size, dict_total / 1024.0, model_bytes / 1024.0, (dict_total + model_bytes) / 1024.0,
+            dict_count, model_count, dict_find, model_find))
+
+
+if __name__ == '__main__':
+    main()
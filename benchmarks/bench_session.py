@@ -0,0 +1,41 @@
+"""
+Simulates a run of intents against the fake backend and reports how many logins the
+shared GrocerySession avoided compared to logging in on every intent
+"""
+import argparse
+import time
+
+from fake_ourgroceries import FakeBackend, client_factory
+from grocery_core.session import GrocerySession
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--intents", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--session-lifetime", type=int, default=20,
+                        help="requests before the fake server expires a session cookie")
+    args = parser.parse_args()
+
+    backend = FakeBackend(latency=args.latency, session_lifetime=args.session_lifetime)
+    list_id = backend.add_list("groceries")
+    session = GrocerySession(client_factory=client_factory(backend))
+    start = time.perf_counter()
+    for intent in range(args.intents):
+        client = session.connect("user", "password")
+        session.run(client.get_my_lists())
+        session.run(client.add_item_to_list(list_id, "item %s" % intent, "uncategorized"))
+    elapsed = time.perf_counter() - start
+    stats = session.stats()
+    session.close()
+
+    print("intents:          %s" % args.intents)
+    print("server logins:    %s" % backend.logins)
+    print("session stats:    %s" % stats)
+    print("elapsed:          %.3fs (%.1fms per intent)" % (elapsed, elapsed / args.intents * 1000))
+    print("login-per-intent would have cost %.3fs more" %
+          ((args.intents - backend.logins) * args.latency * 2))
+
+
+if __name__ == '__main__':
+    main()
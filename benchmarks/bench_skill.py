@@ -0,0 +1,165 @@
+"""
+Runs the skill's own methods (list lookup, refresh, category lookup, single and multi
+item adds) against the fake backend for lists of different sizes and reports latency
+percentiles, calls made to OurGroceries and bytes written to disk. Needs mycroft-core
+importable, as it is inside a Mycroft installation, because the skill module is loaded as is
+
+    python benchmarks/bench_skill.py --sizes 10,1000,50000 --latency 0.02
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_ourgroceries import FakeBackend, client_factory  # noqa: E402
+from grocery_core.instrumentation import percentile  # noqa: E402
+from grocery_core.session import GrocerySession  # noqa: E402
+
+CATEGORY_NAMES = ["Produce", "Dairy", "Bakery", "Meat", "Seafood", "Frozen", "Snacks", "Beverages",
+                  "Pantry", "Spices", "Cleaning", "Paper Goods", "Baby", "Pets", "Pharmacy", "Deli",
+                  "Canned Goods", "Condiments", "Breakfast", "Household"]
+
+
+def load_skill_module():
+    """
+    Imports the skill from the repository root whatever the directory is called
+    :return: the skill module
+    """
+    spec = importlib.util.spec_from_file_location("ourgroceries_skill", os.path.join(ROOT, "__init__.py"),
+                                                  submodule_search_locations=[ROOT])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_backend(size, latency, seed):
+    """
+    :param size: (int) number of items on the list the skill works with
+    :param latency: (float) seconds every request to the fake server takes
+    :param seed: seeds the generated names
+    :return: the backend and the category names
+    """
+    randomizer = random.Random(seed)
+    backend = FakeBackend(latency=latency, seed=seed)
+    category_ids = [backend.add_category(name) for name in CATEGORY_NAMES]
+    items = [("item %s" % number, randomizer.choice(category_ids), randomizer.random() < 0.3)
+             for number in range(size)]
+    backend.add_list("Groceries", items)
+    for number in range(10):
+        backend.add_list("Other List %s" % number, [("other %s" % item, None, False) for item in range(20)])
+    return backend
+
+
+def make_skill(module, backend, latency):
+    skill = module.OurGroceriesSkill()
+    skill.settings = {'user_name': 'bench', 'password': 'bench', 'compress_state_files': True,
+                      'fetch_timeout_seconds': max(10, latency * 100)}
+    skill.speak = lambda *args, **kwargs: None
+    skill.grocery_session = GrocerySession(client_factory=client_factory(backend), metrics=skill.metrics)
+    skill._apply_cache_settings()
+    skill.mutation_queue.start(skill.grocery_session.loop_thread, lambda: skill.grocery_session.client)
+    skill._create_initial_grocery_connection()
+    skill.check_shopping_list_exists({'shoppinglist': 'groceries'})
+    return skill
+
+
+def timed(samples, operation, *args, **kwargs):
+    started = time.perf_counter()
+    result = operation(*args, **kwargs)
+    samples.append((time.perf_counter() - started) * 1000)
+    return result
+
+
+def run_size(module, size, args):
+    """
+    Runs every operation args.repeats times against a list of size items
+    :return: (dict) the measurements for this size
+    """
+    backend = make_backend(size, args.latency, args.seed)
+    randomizer = random.Random(args.seed)
+    skill = make_skill(module, backend, args.latency)
+    samples = {name: [] for name in ("determine_list_id", "refresh_lists cold", "refresh_lists warm",
+                                     "return_category_id", "add_to_my_list", "add_multiple (5 items)")}
+    requests_before = backend.requests
+    for repeat in range(args.repeats):
+        timed(samples["determine_list_id"], skill.determine_list_id, "other list %s" % (repeat % 10))
+        # Dropping the cached copies makes the next refresh download both lists
+        skill.state_cache.invalidate(skill.grocery_state_file)
+        skill.state_cache.invalidate(skill.category_state_file)
+        timed(samples["refresh_lists cold"], skill.refresh_lists)
+        full_list, categories = timed(samples["refresh_lists warm"], skill.refresh_lists)
+        timed(samples["return_category_id"], skill.return_category_id,
+              randomizer.choice(CATEGORY_NAMES).lower().rstrip("s"), categories)
+        timed(samples["add_to_my_list"], skill.add_to_my_list, full_list, "new item %s" % repeat, categories,
+              item_category=randomizer.choice(CATEGORY_NAMES))
+        timed(samples["add_multiple (5 items)"], skill.add_multiple_to_my_list, full_list,
+              ["batch %s %s" % (repeat, number) for number in range(5)], categories)
+    # Wait for the queued adds to reach the fake server so their calls are counted
+    deadline = time.time() + 30
+    while len(skill.mutation_queue) and time.time() < deadline:
+        time.sleep(0.01)
+    requests = backend.requests - requests_before
+    disk_bytes = (skill.state_cache.bytes_written + skill.state_cache.journal_bytes_written +
+                  skill.mutation_queue.bytes_written)
+    skill.shutdown()
+    return {'size': size,
+            'operations': {name: {'p50_ms': round(percentile(sorted(values), 0.5), 2),
+                                  'p95_ms': round(percentile(sorted(values), 0.95), 2),
+                                  'p99_ms': round(percentile(sorted(values), 0.99), 2),
+                                  'max_ms': round(max(values), 2)}
+                           for name, values in samples.items()},
+            'network_calls': requests,
+            'network_calls_per_repeat': round(requests / float(args.repeats), 2),
+            'commands': dict(backend.commands),
+            'disk_bytes_written': disk_bytes,
+            'unsent_changes': len(skill.mutation_queue)}
+
+
+def print_report(result):
+    print("\n%s items: %s calls to OurGroceries (%.1f per round), %s bytes written to disk" %
+          (result['size'], result['network_calls'], result['network_calls_per_repeat'],
+           result['disk_bytes_written']))
+    print("  %-24s %10s %10s %10s %10s" % ("operation", "p50 ms", "p95 ms", "p99 ms", "max ms"))
+    for name, numbers in result['operations'].items():
+        print("  %-24s %10.2f %10.2f %10.2f %10.2f" % (name, numbers['p50_ms'], numbers['p95_ms'],
+                                                     numbers['p99_ms'], numbers['max_ms']))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,100,1000,10000,50000",
+                        help="comma separated list sizes to run")
+    parser.add_argument("--repeats", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds every fake request takes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    module = load_skill_module()
+    results = []
+    working_directory = os.getcwd()
+    for size in [int(size) for size in args.sizes.split(",")]:
+        # The skill keeps its state files in the current directory
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                result = run_size(module, size, args)
+            finally:
+                os.chdir(working_directory)
+        print_report(result)
+        results.append(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'latency': args.latency, 'repeats': args.repeats, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
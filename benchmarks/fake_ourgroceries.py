@@ -0,0 +1,216 @@
+"""
+An in-process stand in for the OurGroceries service. It answers the same api commands
+the skill uses from in-memory lists so the skill helpers can be exercised without an
+account or a network connection
+"""
+import asyncio
+import copy
+import itertools
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grocery_core.client import PooledOurGroceries, SessionExpiredException  # noqa: E402
+from grocery_core.request_gate import RateLimitedException  # noqa: E402
+
+CATEGORY_LIST_ID = "fake-category-list"
+
+
+class FakeBackend(object):
+    """
+    Holds the server side state. Several clients can share one backend which is
+    how multiple devices on one account behave
+    """
+    def __init__(self, latency=0.0, session_lifetime=None, failure_rate=0.0, seed=None):
+        """
+        :param latency: (float) seconds every request takes
+        :param session_lifetime: (int) number of requests a session cookie is good for
+        :param failure_rate: (float) fraction of requests that fail as if the network dropped
+        :param seed: seeds the random failures so runs can be repeated
+        """
+        self.latency = latency
+        self.session_lifetime = session_lifetime
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        # the next this many requests fail, see fail_next()
+        self.failures_pending = 0
+        # the next this many requests are refused with a rate limit error, see rate_limit_next()
+        self.rate_limits_pending = 0
+        self.failed_requests = 0
+        self.ids = itertools.count(1)
+        self.valid_sessions = {}
+        self.logins = 0
+        self.requests = 0
+        self.commands = {}
+        self.lists = {}
+        self.categories = {'id': CATEGORY_LIST_ID, 'name': 'Categories', 'versionId': 'v1', 'items': []}
+
+    def new_id(self, prefix):
+        return "%s%s" % (prefix, next(self.ids))
+
+    def add_list(self, name, items=()):
+        """
+        :param name: (string) the name of the shopping list
+        :param items: iterable of (value, category_id, crossed_off) tuples
+        :return: the id of the new list
+        """
+        list_id = self.new_id("list")
+        self.lists[list_id] = {'id': list_id, 'name': name, 'versionId': 'v1', 'items': []}
+        for value, category_id, crossed_off in items:
+            self.lists[list_id]['items'].append(self._item(value, category_id, crossed_off))
+        return list_id
+
+    def add_category(self, name):
+        category = self._item(name, None, False)
+        self.categories['items'].append(category)
+        return category['id']
+
+    def _item(self, value, category_id, crossed_off):
+        item = {'id': self.new_id("item"), 'value': value, 'crossedOff': crossed_off}
+        if category_id is not None:
+            item['categoryId'] = category_id
+        return item
+
+    def _find_list(self, list_id):
+        if list_id == CATEGORY_LIST_ID:
+            return self.categories
+        return self.lists[list_id]
+
+    @staticmethod
+    def _bump_version(shopping_list):
+        shopping_list['versionId'] = "v%s" % (int(shopping_list['versionId'][1:]) + 1)
+
+    def fail_next(self, count):
+        """
+        Makes the next count requests fail with a connection error
+        :param count: (int) number of requests to fail
+        :return: None
+        """
+        self.failures_pending = count
+
+    def rate_limit_next(self, count):
+        """
+        Makes the next count requests fail as if the server answered HTTP 429
+        :param count: (int) number of requests to refuse
+        :return: None
+        """
+        self.rate_limits_pending = count
+
+    def _should_fail(self):
+        if self.failures_pending > 0:
+            self.failures_pending -= 1
+            return True
+        return self.failure_rate > 0 and self.random.random() < self.failure_rate
+
+    async def login(self):
+        await asyncio.sleep(self.latency)
+        self.logins += 1
+        session_key = self.new_id("session")
+        self.valid_sessions[session_key] = self.session_lifetime
+        return session_key
+
+    async def handle(self, session_key, payload):
+        """
+        Answers one api command
+        :param session_key: (string) the cookie sent by the client
+        :param payload: (dict) the json body sent by the client
+        :return: the json response as a dict
+        """
+        await asyncio.sleep(self.latency)
+        self.requests += 1
+        if self.rate_limits_pending > 0:
+            self.rate_limits_pending -= 1
+            raise RateLimitedException("fake rate limit", retry_after=0.05)
+        if self._should_fail():
+            self.failed_requests += 1
+            raise ConnectionError("fake network failure")
+        if session_key not in self.valid_sessions:
+            raise SessionExpiredException("unknown session")
+        remaining = self.valid_sessions[session_key]
+        if remaining is not None:
+            if remaining <= 0:
+                del self.valid_sessions[session_key]
+                raise SessionExpiredException("session expired")
+            self.valid_sessions[session_key] = remaining - 1
+        command = payload['command']
+        self.commands[command] = self.commands.get(command, 0) + 1
+        return getattr(self, "_command_%s" % command)(payload)
+
+    def _command_getOverview(self, payload):
+        return {'command': 'getOverview',
+                'shoppingLists': [{'id': shopping_list['id'], 'name': shopping_list['name'],
+                                   'versionId': shopping_list['versionId']}
+                                  for shopping_list in self.lists.values()]}
+
+    def _command_getList(self, payload):
+        return {'command': 'getList', 'list': copy.deepcopy(self._find_list(payload['listId']))}
+
+    def _command_insertItem(self, payload):
+        shopping_list = self._find_list(payload['listId'])
+        item = self._item(payload['value'], payload.get('categoryId'), False)
+        shopping_list['items'].append(item)
+        self._bump_version(shopping_list)
+        return {'command': 'insertItem', 'itemId': item['id'], 'listVersionId': shopping_list['versionId']}
+
+    def _command_setItemCrossedOff(self, payload):
+        shopping_list = self._find_list(payload['listId'])
+        for item in shopping_list['items']:
+            if item['id'] == payload['itemId']:
+                item['crossedOff'] = payload['crossedOff']
+        self._bump_version(shopping_list)
+        return {'command': 'setItemCrossedOff', 'listVersionId': shopping_list['versionId']}
+
+    def _command_deleteItem(self, payload):
+        shopping_list = self._find_list(payload['listId'])
+        shopping_list['items'] = [item for item in shopping_list['items'] if item['id'] != payload['itemId']]
+        self._bump_version(shopping_list)
+        return {'command': 'deleteItem', 'listVersionId': shopping_list['versionId']}
+
+    def _command_changeItemValue(self, payload):
+        shopping_list = self._find_list(payload['listId'])
+        for item in shopping_list['items']:
+            if item['id'] == payload['itemId']:
+                item['value'] = payload['newValue']
+                item['categoryId'] = payload.get('categoryId')
+        self._bump_version(shopping_list)
+        return {'command': 'changeItemValue', 'listVersionId': shopping_list['versionId']}
+
+    def _command_createList(self, payload):
+        return {'command': 'createList', 'listId': self.add_list(payload['name'])}
+
+
+class FakeOurGroceries(PooledOurGroceries):
+    """
+    PooledOurGroceries that talks to a FakeBackend instead of www.ourgroceries.com
+    """
+    def __init__(self, username, password, backend=None):
+        PooledOurGroceries.__init__(self, username, password)
+        self.backend = backend or FakeBackend()
+
+    async def _get_session_cookie(self):
+        self._session_key = await self.backend.login()
+
+    async def _get_team_id(self):
+        self._team_id = "fake-team"
+        self._category_id = CATEGORY_LIST_ID
+
+    async def _get_master_list_id(self):
+        self._master_list_id = None
+
+    async def _send(self, payload):
+        return await self.backend.handle(self._session_key, payload)
+
+    async def close(self):
+        pass
+
+
+def client_factory(backend):
+    """
+    :param backend: (FakeBackend) the server every client created should talk to
+    :return: a callable usable as the GrocerySession client_factory
+    """
+    def factory(username, password):
+        return FakeOurGroceries(username, password, backend=backend)
+    return factory
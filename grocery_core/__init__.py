@@ -0,0 +1,5 @@
+"""
+Helpers used by the OurGroceries skill which do not depend on Mycroft itself. Importing
+them has no side effects; only grocery_core.client needs the ourgroceries library and
+aiohttp, and it is loaded when the first connection is made
+"""
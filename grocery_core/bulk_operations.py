@@ -0,0 +1,82 @@
+"""
+Applies one change to many items on a shopping list at once, such as putting every
+crossed off item back on the list. The requests run side by side with a cap on how many
+are in flight, and an item that fails doesn't stop the others
+"""
+import logging
+
+from .event_loop import gather_limited
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 8
+# How often progress is reported, as a fraction of all items
+PROGRESS_STEP = 0.25
+
+
+class BulkResult(object):
+    """
+    What happened to each item of a bulk operation
+    """
+    def __init__(self, total):
+        self.total = total
+        self.succeeded = []
+        self.failed = []
+
+    @property
+    def done(self):
+        return len(self.succeeded) + len(self.failed)
+
+
+def crossed_off_items(full_list):
+    """
+    :param full_list: (dict) the list received from OurGroceries
+    :return: (list) the items that are crossed off
+    """
+    return [item for item in full_list['list']['items'] if item.get('crossedOff') and 'id' in item]
+
+
+def items_in_category(full_list, category_id):
+    """
+    :param full_list: (dict) the list received from OurGroceries
+    :param category_id: (string) the category, None for uncategorized items
+    :return: (list) the items filed under the category
+    """
+    return [item for item in full_list['list']['items'] if item.get('categoryId') == category_id and 'id' in item]
+
+
+async def run_bulk(items, operation, limit=DEFAULT_LIMIT, progress=None):
+    """
+    Runs operation(item) for every item with at most limit requests in flight
+    :param items: (list) the items to change
+    :param operation: (function) takes an item and returns the coroutine that changes it
+    :param limit: (int) the most requests allowed in flight at once
+    :param progress: (function) called with (done, total) each time another quarter is finished
+    :return: BulkResult
+    """
+    result = BulkResult(len(items))
+    step = max(1, int(result.total * PROGRESS_STEP))
+
+    async def run_one(item):
+        try:
+            await operation(item)
+            result.succeeded.append(item)
+        except Exception as error:
+            LOG.warning("Could not update %s: %s" % (item.get('value'), error))
+            result.failed.append(item)
+        if progress is not None and (result.done % step == 0 or result.done == result.total):
+            progress(result.done, result.total)
+    await gather_limited([run_one(item) for item in items], limit=limit)
+    return result
+
+
+def uncross_operation(client, list_id):
+    return lambda item: client.toggle_item_crossed_off(list_id, item['id'], cross_off=False)
+
+
+def remove_operation(client, list_id):
+    return lambda item: client.remove_item_from_list(list_id, item['id'])
+
+
+def move_operation(client, list_id, category_id):
+    return lambda item: client.change_item_on_list(list_id, item['id'], category_id, item['value'])
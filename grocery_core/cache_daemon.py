@@ -0,0 +1,427 @@
+"""
+An optional local daemon which owns the OurGroceries session and a warm copy of the
+lists for every skill on the machine. The skills talk
+to it through DaemonClient, which has the same methods as the OurGroceries client, so
+only one process logs in and downloads and a skill that has just started gets its
+lists straight from memory. There is no authentication, so the daemon only listens on a
+Unix socket or a loopback address.
+
+The protocol is one JSON object per line in both directions:
+
+    request   {"id": 1, "call": "get_list_items", "args": {"list_id": "..."}}
+    response  {"id": 1, "result": {...}}  or  {"id": 1, "error": "...", "kind": "RateLimitedException"}
+    push      {"event": "invalidate", "keys": ["groceries:<list id>", "lists"]}
+
+After a change goes through, every other connected skill is told which cached copies
+it has to drop. Run it from the skill directory:
+
+    python -m grocery_core.cache_daemon --user me@example.com --socket /tmp/ourgroceries.sock
+"""
+import argparse
+import asyncio
+import getpass
+import ipaddress
+import json
+import logging
+import os
+import time
+
+from .request_gate import RateLimitedException
+from .sync_engine import SyncEngine
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_MAX_AGE = 30
+# A large list is sent as a single line, the asyncio default of 64KB is far too small
+LINE_LIMIT = 64 * 1024 * 1024
+LISTS_KEY = "lists"
+CATEGORIES_KEY = "categories"
+GROCERIES_KEY = "groceries:%s"
+# call -> the keys of the cached copies it makes out of date, given its arguments. Every
+# write also changes the versions in the overview of all lists
+WRITE_CALLS = {
+    'add_item_to_list': lambda args: [GROCERIES_KEY % args['list_id']],
+    'toggle_item_crossed_off': lambda args: [GROCERIES_KEY % args['list_id']],
+    'remove_item_from_list': lambda args: [GROCERIES_KEY % args['list_id']],
+    'change_item_on_list': lambda args: [GROCERIES_KEY % args['list_id']],
+    'create_category': lambda args: [CATEGORIES_KEY],
+    'create_list': lambda args: [LISTS_KEY],
+}
+
+
+class CacheDaemonException(Exception):
+    """
+    The daemon could not answer a call, or OurGroceries gave it an error
+    """
+
+
+def parse_address(address):
+    """
+    :param address: (string) a socket path, or host:port for a TCP socket
+    :return: (tuple) ("unix", path) or ("tcp", host, port)
+    """
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit() and os.sep not in address:
+        return "tcp", host, int(port)
+    return "unix", address
+
+
+def is_loopback(host):
+    """
+    :param host: (string) the host part of a TCP address
+    :return: (bool) True if only this machine can connect to it
+    """
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        # Any other name could resolve to an address reachable from the network
+        return False
+
+
+def encode(message):
+    return (json.dumps(message, separators=(',', ':')) + "\n").encode()
+
+
+class CacheDaemon(object):
+    """
+    Serves the calls of DaemonClient. Reads are answered from memory while they are
+    younger than max_age, shopping lists are only downloaded again when their version
+    has changed, and writes go straight to OurGroceries
+    """
+    def __init__(self, client, max_age=DEFAULT_MAX_AGE, clock=time.time):
+        """
+        :param client: (OurGroceries) the logged in client every call goes through
+        :param max_age: (float) seconds a downloaded list is handed out before it is checked again
+        :param clock: (function) returns the current time in seconds
+        """
+        self.client = client
+        self.max_age = max_age
+        self.clock = clock
+        self.sync_engine = SyncEngine(overview_max_age=max_age)
+        # key -> (time it was fetched, the data)
+        self.cache = {}
+        self.connections = set()
+        self.calls = 0
+        self.reads_from_memory = 0
+        self.invalidations_pushed = 0
+
+    async def serve(self, address):
+        """
+        Accepts skills on the address until cancelled
+        :param address: (string) a socket path or host:port
+        :return: None
+        """
+        parsed = parse_address(address)
+        if parsed[0] == "tcp" and not is_loopback(parsed[1]):
+            # Anyone who can connect could read and change the lists without a password
+            raise ValueError("The cache daemon only listens on loopback addresses, not %s" % parsed[1])
+        if parsed[0] == "unix":
+            if os.path.exists(parsed[1]):
+                os.remove(parsed[1])
+            server = await asyncio.start_unix_server(self.handle_connection, parsed[1], limit=LINE_LIMIT)
+            # Anyone who can reach the socket can use the account behind it
+            os.chmod(parsed[1], 0o600)
+        else:
+            server = await asyncio.start_server(self.handle_connection, parsed[1], parsed[2], limit=LINE_LIMIT)
+        LOG.info("OurGroceries cache daemon listening on %s" % address)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        self.connections.add(writer)
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                # Answered in any order, so a slow download doesn't hold up the calls behind it
+                task = asyncio.ensure_future(self.answer(json.loads(line), writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, ValueError) as error:
+            LOG.warning("Dropping a skill connection: %s" % error)
+        finally:
+            self.connections.discard(writer)
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def answer(self, request, writer):
+        try:
+            response = {'id': request.get('id'), 'result': await self.call(request['call'], request.get('args') or {},
+                                                                          origin=writer)}
+        except Exception as error:
+            LOG.warning("%s failed: %s" % (request.get('call'), error))
+            response = {'id': request.get('id'), 'error': str(error), 'kind': type(error).__name__}
+        if not writer.is_closing():
+            writer.write(encode(response))
+            await writer.drain()
+
+    async def call(self, call, args, origin=None):
+        """
+        :param call: (string) the name of the OurGroceries client method
+        :param args: (dict) its keyword arguments
+        :param origin: the connection the call came from, which is not sent its own invalidation
+        :return: the result of the call
+        """
+        self.calls += 1
+        if call == 'ping':
+            return self.stats()
+        if call == 'get_my_lists':
+            return await self._read(LISTS_KEY, lambda: self.sync_engine.fetch_overview(self.client, self.max_age))
+        if call == 'get_category_items':
+            return await self._read(CATEGORIES_KEY, self.client.get_category_items)
+        if call == 'get_list_items':
+            return await self._read_list(args['list_id'])
+        if call not in WRITE_CALLS:
+            raise CacheDaemonException("Unknown call %s" % call)
+        result = await getattr(self.client, call)(**args)
+        keys = WRITE_CALLS[call](args)
+        for key in keys + [LISTS_KEY]:
+            self.cache.pop(key, None)
+        self.sync_engine.forget_overview()
+        self.push_invalidation(keys, origin)
+        return result
+
+    async def _read(self, key, fetch):
+        entry = self.cache.get(key)
+        if entry is not None and self.clock() - entry[0] <= self.max_age:
+            self.reads_from_memory += 1
+            return entry[1]
+        data = await fetch()
+        self.cache[key] = (self.clock(), data)
+        return data
+
+    async def _read_list(self, list_id):
+        key = GROCERIES_KEY % list_id
+        entry = self.cache.get(key)
+        if entry is not None and self.clock() - entry[0] <= self.max_age:
+            self.reads_from_memory += 1
+            return entry[1]
+        # An old copy is kept until here so the sync engine can skip the download if nothing changed
+        data = await self.sync_engine.sync_list(self.client, list_id, entry[1] if entry else None)
+        self.cache[key] = (self.clock(), data)
+        return data
+
+    def push_invalidation(self, keys, origin=None):
+        """
+        Tells every connected skill but the one that made the change to drop its copies
+        :param keys: (list) the cache keys that are out of date
+        :param origin: the connection that made the change, it updated its own copy
+        :return: None
+        """
+        message = encode({'event': 'invalidate', 'keys': keys})
+        for writer in list(self.connections):
+            if writer is not origin and not writer.is_closing():
+                writer.write(message)
+                self.invalidations_pushed += 1
+
+    def stats(self):
+        return {'connections': len(self.connections),
+                'calls': self.calls,
+                'reads_from_memory': self.reads_from_memory,
+                'invalidations_pushed': self.invalidations_pushed,
+                'sync': self.sync_engine.stats()}
+
+
+class DaemonClient(object):
+    """
+    Stands in for the OurGroceries client in a skill and forwards every call to the
+    daemon over one connection. Invalidations pushed by the daemon are handed to
+    on_invalidate with the list of keys, or None after a reconnect when anything may
+    have changed in the meantime
+    """
+    def __init__(self, address, on_invalidate=None):
+        """
+        :param address: (string) the daemon's socket path or host:port
+        :param on_invalidate: (function) called on the event loop with the keys to drop
+        """
+        self.address = address
+        self.on_invalidate = on_invalidate
+        # The attributes GrocerySession expects of a client. The daemon does the logging in
+        self.login_count = 0
+        self.relogin_count = 0
+        self.metrics = None
+        self.gate = None
+        self.connect_count = 0
+        self._reader = None
+        self._writer = None
+        self._listener = None
+        self._pending = {}
+        self._next_id = 0
+        self._connecting = None
+
+    async def login(self):
+        """
+        Connects to the daemon, which is the only login the skill needs
+        :return: None
+        """
+        await self._connection()
+
+    async def _connection(self):
+        if self._writer is not None and not self._writer.is_closing():
+            return self._writer
+        if self._connecting is None:
+            self._connecting = asyncio.ensure_future(self._connect())
+        try:
+            await asyncio.shield(self._connecting)
+        finally:
+            self._connecting = None
+        return self._writer
+
+    async def _connect(self):
+        parsed = parse_address(self.address)
+        if parsed[0] == "unix":
+            self._reader, self._writer = await asyncio.open_unix_connection(parsed[1], limit=LINE_LIMIT)
+        else:
+            self._reader, self._writer = await asyncio.open_connection(parsed[1], parsed[2], limit=LINE_LIMIT)
+        self.connect_count += 1
+        self._listener = asyncio.ensure_future(self._listen(self._reader))
+        if self.connect_count > 1 and self.on_invalidate is not None:
+            # Pushes sent while the connection was down are lost
+            self.on_invalidate(None)
+
+    async def _listen(self, reader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message.get('event') == 'invalidate':
+                    if self.on_invalidate is not None:
+                        self.on_invalidate(message['keys'])
+                    continue
+                waiter = self._pending.pop(message.get('id'), None)
+                if waiter is None or waiter.done():
+                    continue
+                if 'error' in message:
+                    waiter.set_exception(self._error(message))
+                else:
+                    waiter.set_result(message['result'])
+        except (ConnectionError, ValueError) as error:
+            LOG.warning("Lost the connection to the cache daemon: %s" % error)
+        finally:
+            self._writer = None
+            pending, self._pending = self._pending, {}
+            for waiter in pending.values():
+                if not waiter.done():
+                    waiter.set_exception(ConnectionError("The cache daemon closed the connection"))
+
+    @staticmethod
+    def _error(message):
+        if message.get('kind') == 'RateLimitedException':
+            return RateLimitedException(message['error'])
+        return CacheDaemonException(message['error'])
+
+    async def _call(self, call, **args):
+        writer = await self._connection()
+        self._next_id += 1
+        request_id = self._next_id
+        waiter = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = waiter
+        writer.write(encode({'id': request_id, 'call': call, 'args': args}))
+        try:
+            if self.metrics is None:
+                await writer.drain()
+                return await waiter
+            with self.metrics.timer("daemon.%s" % call):
+                await writer.drain()
+                return await waiter
+        finally:
+            if call in WRITE_CALLS and self.gate is not None:
+                # The daemon's writes skip the gate, but the skill's sync engine watches its generation
+                self.gate.generation += 1
+
+    async def get_my_lists(self):
+        return await self._call('get_my_lists')
+
+    async def get_category_items(self):
+        return await self._call('get_category_items')
+
+    async def get_list_items(self, list_id):
+        return await self._call('get_list_items', list_id=list_id)
+
+    async def add_item_to_list(self, list_id, value, category='uncategorized'):
+        return await self._call('add_item_to_list', list_id=list_id, value=value, category=category)
+
+    async def toggle_item_crossed_off(self, list_id, item_id, cross_off=False):
+        return await self._call('toggle_item_crossed_off', list_id=list_id, item_id=item_id, cross_off=cross_off)
+
+    async def remove_item_from_list(self, list_id, item_id):
+        return await self._call('remove_item_from_list', list_id=list_id, item_id=item_id)
+
+    async def change_item_on_list(self, list_id, item_id, category_id, value):
+        return await self._call('change_item_on_list', list_id=list_id, item_id=item_id,
+                                category_id=category_id, value=value)
+
+    async def create_category(self, name):
+        return await self._call('create_category', name=name)
+
+    async def create_list(self, name, list_type='SHOPPING'):
+        return await self._call('create_list', name=name, list_type=list_type)
+
+    async def ping(self):
+        """
+        :return: (dict) the daemon's stats
+        """
+        return await self._call('ping')
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+
+def daemon_client_factory(address, on_invalidate=None):
+    """
+    :param address: (string) the daemon's socket path or host:port
+    :param on_invalidate: (function) see DaemonClient
+    :return: (function) a client factory for GrocerySession, which ignores the credentials
+    """
+    return lambda username, password: DaemonClient(address, on_invalidate)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Share one OurGroceries session and cache between skills")
+    parser.add_argument("--user", required=True, help="the OurGroceries account (email address)")
+    parser.add_argument("--socket", default="/tmp/ourgroceries.sock",
+                        help="a socket path, or 127.0.0.1:port to listen on TCP")
+    parser.add_argument("--max-age", type=float, default=DEFAULT_MAX_AGE,
+                        help="seconds a downloaded list is handed out before it is checked again")
+    args = parser.parse_args(argv)
+    parsed = parse_address(args.socket)
+    if parsed[0] == "tcp" and not is_loopback(parsed[1]):
+        parser.error("--socket must be a socket path or a loopback address such as 127.0.0.1:8765")
+    return args
+
+
+async def run_daemon(args, password):
+    # Only the daemon needs the library and aiohttp, the skills just need a socket
+    from .client import PooledOurGroceries
+    client = PooledOurGroceries(args.user, password)
+    await client.login()
+    try:
+        await CacheDaemon(client, max_age=args.max_age).serve(args.socket)
+    finally:
+        await client.close()
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args(argv)
+    password = os.environ.get("OURGROCERIES_PASSWORD") or getpass.getpass("OurGroceries password: ")
+    try:
+        asyncio.run(run_daemon(args, password))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+Turns a spoken category name into an OurGroceries category id with a single dict lookup
+"""
+import re
+
+from .item_index import normalize_name
+
+# Duplicate categories present as "{{item}} (2)"
+DUPLICATE_SUFFIX = re.compile(r"\s*\(\d+\)$")
+
+
+def edit_distance(first, second, max_distance):
+    """
+    Levenshtein distance which only works out the cells within max_distance of the
+    diagonal and gives up as soon as max_distance is exceeded
+    :param first: (string)
+    :param second: (string)
+    :param max_distance: (int) the largest distance that is of interest
+    :return: (int) the distance or max_distance + 1 if it is larger than that
+    """
+    too_far = max_distance + 1
+    if abs(len(first) - len(second)) > max_distance:
+        return too_far
+    previous = [min(column, too_far) for column in range(len(second) + 1)]
+    for row, first_char in enumerate(first, 1):
+        low = max(1, row - max_distance)
+        high = min(len(second), row + max_distance)
+        current = [too_far] * (len(second) + 1)
+        current[0] = min(row, too_far)
+        for column in range(low, high + 1):
+            current[column] = min(previous[column] + 1,
+                                  current[column - 1] + 1,
+                                  previous[column - 1] + (first_char != second[column - 1]))
+        if min(current[low - 1:high + 1]) > max_distance:
+            return too_far
+        previous = current
+    return min(previous[-1], too_far)
+
+
+def deletions(word):
+    """
+    :param word: (string)
+    :return: (set) the word with any one of its letters left out
+    """
+    return {word[:position] + word[position + 1:] for position in range(len(word))}
+
+
+class CategoryResolver(object):
+    """
+    Precomputes every form a category heading could be asked for by (the heading itself,
+    its first word, the heading without a "(2)" duplicate suffix and its singular forms)
+    so resolving a category no longer walks every heading. It is built once for each
+    download of the category list
+    """
+    def __init__(self, all_categories, fuzzy=True):
+        """
+        :param all_categories: (dict) all the categories currently defined at OurGroceries
+        :param fuzzy: (bool) fall back to the closest heading when there is no exact match
+        """
+        self.all_categories = all_categories
+        self.fuzzy = fuzzy
+        self.forms = {}
+        for category_heading in all_categories['list']['items']:
+            for form in self._heading_forms(category_heading['value']):
+                # The first heading wins, the same as the order categories were checked in
+                if form not in self.forms:
+                    self.forms[form] = category_heading['id']
+        # Built on the first fuzzy lookup, see _variants
+        self.variants = None
+        self.ranks = None
+
+    @staticmethod
+    def _heading_forms(heading):
+        heading = DUPLICATE_SUFFIX.sub("", normalize_name(heading))
+        if not heading:
+            return []
+        forms = [heading, heading.split()[0]]
+        for form in list(forms):
+            # attempt to compensate for plurals in categories
+            if form.endswith("ies") and len(form) > 3:
+                forms.append(form[:-3])
+                forms.append(form[:-3] + "y")
+            if form.endswith("s") and len(form) > 1:
+                forms.append(form[:-1])
+        return forms
+
+    def is_for(self, all_categories):
+        return self.all_categories is all_categories
+
+    def resolve(self, category_to_search_for, fuzzy=None):
+        """
+        :param category_to_search_for: (string) the category as spoken by the user
+        :param fuzzy: (bool) overrides the fuzzy setting of the resolver for this lookup
+        :return: the category id or None if there is no such category
+        """
+        if category_to_search_for is None:
+            return None
+        category = normalize_name(category_to_search_for)
+        if not category:
+            return None
+        # If we assume the last character is a plural 'S' or the last 3 are 'ies', slice them off
+        candidates = (category, category[:-1], category[:-3])
+        if category.endswith("ies"):
+            # "candies" for a "Candy" heading
+            candidates += (category[:-3] + "y",)
+        for candidate in candidates:
+            if candidate and candidate in self.forms:
+                return self.forms[candidate]
+        if fuzzy is None:
+            fuzzy = self.fuzzy
+        if fuzzy:
+            return self._closest(category)
+        return None
+
+    def _closest(self, category):
+        """
+        Finds the heading closest to a misheard category, allowing one edit for short
+        names and two for longer ones. The candidates are the forms that match the category
+        with a letter left out of either, or two left out of a long category, which
+        covers one edit, a swapped pair of letters and an extra letter plus a wrong one
+        :param category: (string) the normalized category
+        :return: the category id or None
+        """
+        max_distance = 1 if len(category) <= 5 else 2
+        one_letter_less = deletions(category)
+        best_form = self._best_form(category, one_letter_less | {category}, max_distance)
+        if best_form is None and max_distance > 1:
+            # An extra letter as well as a wrong one
+            two_letters_less = set()
+            for variant in one_letter_less:
+                two_letters_less |= deletions(variant)
+            best_form = self._best_form(category, two_letters_less, max_distance)
+        if best_form is None:
+            return None
+        return self.forms[best_form]
+
+    def _variants(self):
+        """
+        Maps every form, and every form with one letter left out, to the forms it came
+        from. Forms within an edit or two of a misheard category share one of these with
+        it, whichever letter was misheard, so only those have to be compared
+        :return: (dict) variant -> list of forms
+        """
+        if self.variants is None:
+            self.variants = {}
+            self.ranks = {}
+            for form in self.forms:
+                self.ranks[form] = len(self.ranks)
+                for variant in deletions(form) | {form}:
+                    self.variants.setdefault(variant, []).append(form)
+        return self.variants
+
+    def _best_form(self, category, variants, max_distance):
+        """
+        :param category: (string) the normalized category
+        :param variants: (set) strings a close form would share with the category
+        :param max_distance: (int) the most edits allowed
+        :return: (string) the closest form within max_distance or None
+        """
+        known_variants = self._variants()
+        candidates = set()
+        for variant in variants:
+            candidates.update(known_variants.get(variant, ()))
+        best_form = None
+        best_distance = max_distance + 1
+        # In heading order, so the earlier of two equally close headings wins
+        for form in sorted(candidates, key=self.ranks.get):
+            distance = edit_distance(category, form, max_distance)
+            if distance < best_distance:
+                best_form = form
+                best_distance = distance
+        return best_form
@@ -0,0 +1,144 @@
+"""
+The OurGroceries client used by the skill. This is the only module that needs the
+ourgroceries library and aiohttp, so it is imported when the first connection is made
+rather than when the skill loads
+"""
+import logging
+
+import aiohttp
+from ourgroceries import OurGroceries, COOKIE_KEY_SESSION, YOUR_LISTS, ATTR_COMMAND, ATTR_TEAM_ID, \
+    ACTION_GET_LIST, ACTION_ITEM_RENAME, ATTR_LIST_ID, ATTR_ITEM_ID, ATTR_ITEM_CATEGORY, ATTR_ITEM_CROSSED
+
+from .instrumentation import instrumented
+from .request_gate import RateLimitedException, RequestGate
+
+LOG = logging.getLogger(__name__)
+
+
+class SessionExpiredException(Exception):
+    pass
+
+
+class PooledOurGroceries(OurGroceries):
+    """
+    OurGroceries client that sends every API call through one aiohttp session so the
+    underlying connection is reused instead of being rebuilt for each request.
+    If the server rejects the session cookie, the client logs in again and retries once
+    """
+    def __init__(self, username, password, connection_limit=4):
+        OurGroceries.__init__(self, username, password)
+        self.connection_limit = connection_limit
+        self.login_count = 0
+        self.relogin_count = 0
+        self._http_session = None
+        # Set by the GrocerySession so every call to OurGroceries is timed
+        self.metrics = None
+        # Shares identical reads and keeps the request rate down, see RequestGate
+        self.gate = RequestGate(limit=connection_limit)
+
+    @instrumented("network.login")
+    async def login(self):
+        """
+        Logs into OurGroceries and keeps track of how often that has happened
+        :return: None
+        """
+        self.login_count += 1
+        await OurGroceries.login(self)
+
+    def _get_http_session(self):
+        """
+        The aiohttp session is created lazily because it has to be created inside
+        the event loop it will be used from
+        :return: aiohttp.ClientSession
+        """
+        if self._http_session is None or self._http_session.closed:
+            connector = aiohttp.TCPConnector(limit=self.connection_limit)
+            self._http_session = aiohttp.ClientSession(connector=connector)
+        return self._http_session
+
+    def _build_payload(self, command, other_payload=None):
+        payload = {ATTR_COMMAND: command}
+        if self._team_id:
+            payload[ATTR_TEAM_ID] = self._team_id
+        if other_payload:
+            payload = {**payload, **other_payload}
+        return payload
+
+    async def _send(self, payload):
+        """
+        Posts the payload to OurGroceries using the pooled connection
+        :param payload: (dict) the full command sent to the api
+        :return: the decoded json response
+        """
+        cookies = {COOKIE_KEY_SESSION: self._session_key}
+        session = self._get_http_session()
+        async with session.post(YOUR_LISTS, json=payload, cookies=cookies, allow_redirects=False) as resp:
+            # An expired cookie is bounced to the sign in page instead of getting json back
+            if resp.status == 429:
+                retry_after = resp.headers.get('Retry-After', '')
+                raise RateLimitedException("OurGroceries is rate limiting requests",
+                                           float(retry_after) if retry_after.isdigit() else None)
+            if resp.status >= 500:
+                # Says nothing about the session, so no point logging in again
+                resp.raise_for_status()
+            if resp.status in (301, 302, 303, 401, 403) or resp.content_type != 'application/json':
+                raise SessionExpiredException("OurGroceries rejected the session cookie")
+            return await resp.json()
+
+    async def _post(self, command, other_payload=None):
+        """
+        Replaces the library version which opens a new connection for every call. Every
+        call goes through the request gate so all the library's methods share its limits
+        :param command: (string) the OurGroceries api command
+        :param other_payload: (dict) any extra fields for the command
+        :return: the decoded json response
+        """
+        return await self.gate.call(command, other_payload, lambda: self._timed_post(command, other_payload))
+
+    async def _timed_post(self, command, other_payload=None):
+        if self.metrics is None:
+            return await self._post_with_relogin(command, other_payload)
+        with self.metrics.timer("network.%s" % command):
+            return await self._post_with_relogin(command, other_payload)
+
+    async def _post_with_relogin(self, command, other_payload=None):
+        if not self._session_key:
+            await self.login()
+        try:
+            return await self._send(self._build_payload(command, other_payload))
+        except SessionExpiredException:
+            LOG.info("OurGroceries session expired, logging in again")
+            self.relogin_count += 1
+            self._session_key = None
+            await self.login()
+            return await self._send(self._build_payload(command, other_payload))
+
+    async def get_list_items(self, list_id):
+        """
+        Replaces the library version, which marks every item as not crossed off because it
+        checks for the key with hasattr instead of looking in the dict
+        :param list_id: (string) the shopping list to fetch
+        :return: the list with crossedOff set on every item
+        """
+        data = await self._post(ACTION_GET_LIST, {ATTR_LIST_ID: list_id})
+        for item in data['list']['items']:
+            item.setdefault(ATTR_ITEM_CROSSED, False)
+        return data
+
+    async def change_item_on_list(self, list_id, item_id, category_id, value):
+        """
+        Renames an item and/or moves it to another category. Older releases of the
+        library have no call for this even though they know the command
+        :param list_id: (string) the shopping list the item is on
+        :param item_id: (string) the item to change
+        :param category_id: (string) the category the item should be in
+        :param value: (string) the name the item should have
+        :return: the decoded json response
+        """
+        other_payload = {ATTR_LIST_ID: list_id, ATTR_ITEM_ID: item_id, 'newValue': value,
+                         ATTR_ITEM_CATEGORY: category_id}
+        return await self._post(ACTION_ITEM_RENAME, other_payload)
+
+    async def close(self):
+        if self._http_session is not None and not self._http_session.closed:
+            await self._http_session.close()
@@ -0,0 +1,110 @@
+"""
+A single asyncio event loop running in a background thread. Everything that talks to
+OurGroceries is submitted to this loop so it is created once for the life of the skill
+instead of once per network call
+"""
+import asyncio
+import threading
+
+
+async def gather_limited(coroutines, limit=None, return_exceptions=False):
+    """
+    asyncio.gather with an optional cap on how many coroutines run at the same time
+    :param coroutines: iterable of awaitables
+    :param limit: (int) the most coroutines allowed to run at once, None for no limit
+    :param return_exceptions: (bool) return exceptions in place of results instead of raising
+    :return: list of results in the same order as the coroutines
+    """
+    if not limit:
+        return await asyncio.gather(*coroutines, return_exceptions=return_exceptions)
+    semaphore = asyncio.Semaphore(limit)
+
+    async def limited(coroutine):
+        async with semaphore:
+            return await coroutine
+    return await asyncio.gather(*[limited(coroutine) for coroutine in coroutines],
+                                return_exceptions=return_exceptions)
+
+
+class EventLoopThread(object):
+    """
+    Owns a daemon thread running an event loop forever. Synchronous code (the intent
+    handlers) hands coroutines to it and blocks on the result
+    """
+    def __init__(self, name="ourgroceries-event-loop"):
+        self.name = name
+        self.loop = None
+        self.thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the loop thread if it is not already running
+        :return: None
+        """
+        with self._lock:
+            if self.is_running():
+                return
+            self.loop = asyncio.new_event_loop()
+            started = threading.Event()
+            self.thread = threading.Thread(target=self._run_forever, args=(started,), name=self.name, daemon=True)
+            self.thread.start()
+            started.wait()
+
+    def _run_forever(self, started):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(started.set)
+        self.loop.run_forever()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def submit(self, coroutine):
+        """
+        Schedules the coroutine without waiting for it
+        :param coroutine: the awaitable to run on the loop
+        :return: concurrent.futures.Future for the result
+        """
+        if threading.current_thread() is self.thread:
+            raise RuntimeError("submit() would deadlock when called from the event loop thread")
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine, timeout=None):
+        """
+        Runs the coroutine on the loop and blocks until it is done
+        :param coroutine: the awaitable to run on the loop
+        :param timeout: (float) seconds to wait before giving up
+        :return: the result of the coroutine
+        """
+        future = self.submit(coroutine)
+        try:
+            return future.result(timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+    def run_all(self, coroutines, timeout=None, return_exceptions=False, limit=None):
+        """
+        Runs independent coroutines at the same time and waits for all of them
+        :param coroutines: iterable of awaitables
+        :param timeout: (float) seconds to wait for the whole group
+        :param return_exceptions: (bool) return exceptions in place of results instead of raising
+        :param limit: (int) the most coroutines allowed to run at once, None for no limit
+        :return: list of results in the same order as the coroutines
+        """
+        return self.run(gather_limited(coroutines, limit, return_exceptions), timeout)
+
+    def stop(self):
+        """
+        Stops the loop and waits for the thread to exit
+        :return: None
+        """
+        with self._lock:
+            if not self.is_running():
+                return
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.thread = None
+            self.loop = None
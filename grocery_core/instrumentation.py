@@ -0,0 +1,134 @@
+"""
+Lightweight timing for the skill. Each measured stage (an intent, a cache check, a call
+to OurGroceries) is recorded with its duration in a fixed size ring buffer, so the cost
+is one clock read and one append and memory use never grows
+"""
+import collections
+import functools
+import inspect
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_CAPACITY = 1000
+
+
+def percentile(sorted_values, fraction):
+    """
+    :param sorted_values: (list) values in ascending order
+    :param fraction: (float) between 0 and 1, e.g. 0.95
+    :return: the value at that fraction of the list (nearest rank)
+    """
+    if not sorted_values:
+        return 0.0
+    position = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[position]
+
+
+class Metrics(object):
+    """
+    Keeps the most recent stage timings plus running totals of how often each stage and
+    each named event (cache hits, misses, ...) happened since the skill started
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY, clock=time.perf_counter):
+        """
+        :param capacity: (int) how many timings are kept, the oldest are dropped first
+        :param clock: (function) returns a monotonic time in seconds
+        """
+        self.clock = clock
+        self.samples = collections.deque(maxlen=capacity)
+        self.counters = collections.Counter()
+        self.started_at = time.time()
+        # Stages are recorded from the intent threads and the event loop thread
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples.append((stage, seconds))
+            self.counters[stage] += 1
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Times the body of a with block, also when it raises
+        :param stage: (string) the name the timing is recorded under
+        """
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.record(stage, self.clock() - started)
+
+    def summary(self):
+        """
+        :return: (dict) stage -> count, mean, p50, p95 and max in milliseconds over the
+                 timings still in the ring buffer, plus the running totals
+        """
+        with self._lock:
+            samples = list(self.samples)
+            counters = dict(self.counters)
+        by_stage = collections.defaultdict(list)
+        for stage, seconds in samples:
+            by_stage[stage].append(seconds * 1000)
+        stages = {}
+        for stage, values in sorted(by_stage.items()):
+            values.sort()
+            stages[stage] = {'count': len(values),
+                             'mean_ms': round(sum(values) / len(values), 2),
+                             'p50_ms': round(percentile(values, 0.5), 2),
+                             'p95_ms': round(percentile(values, 0.95), 2),
+                             'max_ms': round(values[-1], 2)}
+        return {'uptime_seconds': round(time.time() - self.started_at),
+                'stages': stages,
+                'totals': counters}
+
+    def dump(self, path, extra=None):
+        """
+        Writes the summary as JSON, e.g. for attaching to a bug report
+        :param path: (string) where to write it
+        :param extra: (dict) more sections to include, such as cache statistics
+        :return: (dict) what was written
+        """
+        report = self.summary()
+        report.update(extra or {})
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        return report
+
+    def clear(self):
+        with self._lock:
+            self.samples.clear()
+            self.counters.clear()
+
+
+def instrumented(stage):
+    """
+    Decorator for methods of an object with a metrics attribute. Records how long every
+    call takes under stage. Works for plain methods and coroutines
+    :param stage: (string) the name the timing is recorded under
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                metrics = getattr(self, 'metrics', None)
+                if metrics is None:
+                    return await func(self, *args, **kwargs)
+                with metrics.timer(stage):
+                    return await func(self, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            metrics = getattr(self, 'metrics', None)
+            if metrics is None:
+                return func(self, *args, **kwargs)
+            with metrics.timer(stage):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,106 @@
+"""
+An in-memory index over a cached OurGroceries list so items can be found by name
+without scanning the whole list
+"""
+
+
+def normalize_name(name):
+    """
+    Lower cases the name and collapses any whitespace so "Peanut  Butter " and
+    "peanut butter" are treated as the same item
+    :param name: (string) the item name as spoken or as stored at OurGroceries
+    :return: (string)
+    """
+    return " ".join(name.lower().split())
+
+
+class GroceryIndex(object):
+    """
+    Maps the normalized name of every item in full_list['list']['items'] to its position
+    in that list. The index is built once when the list is loaded and kept up to date by
+    the record_* methods whenever the skill changes the list locally
+    """
+    def __init__(self, full_list):
+        """
+        :param full_list: (dict) the list received from OurGroceries
+        """
+        self.full_list = full_list
+        self.rebuild()
+
+    def rebuild(self):
+        """
+        Indexes the whole list again, used after items were removed or renamed in place
+        :return: None
+        """
+        self.items = self.full_list['list']['items']
+        self.positions = {}
+        for position, item in enumerate(self.items):
+            self._index(position, item)
+        self.indexed = len(self.items)
+
+    def index_item(self, position):
+        """
+        Adds the item at position to the index, used for items appended to the list
+        :param position: (int) the position of the item in the list
+        :return: None
+        """
+        self._index(position, self.items[position])
+        self.indexed = max(self.indexed, position + 1)
+
+    def _index(self, position, item):
+        key = normalize_name(item['value'])
+        current = self.positions.get(key)
+        # When an item is on the list more than once prefer the copy that is not crossed off
+        if current is None or (self.items[current].get('crossedOff') and not item.get('crossedOff')):
+            self.positions[key] = position
+
+    def is_for(self, full_list):
+        # Items appended to the list behind the index's back (e.g. replayed from another
+        # process's journal) mean the index is out of date
+        return (self.full_list is full_list and self.items is full_list['list']['items']
+                and self.indexed == len(self.items))
+
+    def find(self, item_name):
+        """
+        :param item_name: (string) the name of the item
+        :return: (dict) the item as stored in the list or None
+        """
+        position = self.positions.get(normalize_name(item_name))
+        if position is None:
+            return None
+        return self.items[position]
+
+    def __contains__(self, item_name):
+        return normalize_name(item_name) in self.positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def record_added(self, item_name, category_id):
+        """
+        Records an item that has been added to the list at OurGroceries
+        :param item_name: (string) the item that was added
+        :param category_id: (string) the category it was added to
+        :return: None
+        """
+        # NOTE the id of the new object is not retrieved from the server so the entry has no id.
+        # This is simply to make sure we dont add duplicates without another call to OurGroceries
+        new_item = {'value': item_name, 'categoryId': category_id}
+        key = normalize_name(item_name)
+        position = self.positions.get(key)
+        if position is None:
+            self.positions[key] = len(self.items)
+            self.items.append(new_item)
+            self.indexed = len(self.items)
+        else:
+            self.items[position] = new_item
+
+    def record_moved(self, item_name, category_id):
+        item = self.find(item_name)
+        if item is not None:
+            item['categoryId'] = category_id
+
+    def record_uncrossed(self, item_name):
+        item = self.find(item_name)
+        if item is not None:
+            item['crossedOff'] = False
@@ -0,0 +1,102 @@
+"""
+Splits a spoken list of items ("peanut butter and ice cream milk") into the items it
+names, using a trie of the item names the skill has seen on the user's lists so names
+of more than one word are kept together
+"""
+from .item_index import normalize_name
+
+# Words between items that are never items themselves, unless part of a known name
+CONNECTORS = frozenset(("and", "plus", "also", "then"))
+# Marks a node of the trie where a known name ends
+END = ""
+
+
+def _key(word):
+    return word.lower().strip(",.;")
+
+
+class ItemSegmenter(object):
+    """
+    A trie over the words of every known item name. Names are only ever added, so items
+    that were added once and later removed from the list are still recognised
+    """
+    def __init__(self):
+        self.root = {}
+        self.names = 0
+        # The most words in a known name, nothing longer has to be looked at
+        self.longest = 0
+        # list id -> (the list dict, its version, the number of items learnt from it)
+        self.learnt = {}
+
+    def learn(self, item_name):
+        """
+        :param item_name: (string) an item name, as stored at OurGroceries or as spoken
+        :return: None
+        """
+        words = [_key(word) for word in normalize_name(item_name).split()]
+        words = [word for word in words if word]
+        if not words:
+            return
+        node = self.root
+        for word in words:
+            node = node.setdefault(word, {})
+        if END not in node:
+            node[END] = True
+            self.names += 1
+            self.longest = max(self.longest, len(words))
+
+    def learn_list(self, full_list):
+        """
+        Learns the names on a list. Only the items appended since the last call are read
+        when it is the same list at the same version, so calling this on every refresh is cheap
+        :param full_list: (dict) a list as received from OurGroceries
+        :return: None
+        """
+        raw_list = full_list.get('list') or {}
+        items = raw_list.get('items') or []
+        source, version, count = self.learnt.get(raw_list.get('id'), (None, None, 0))
+        if source is not full_list or version != raw_list.get('versionId') or count > len(items):
+            count = 0
+        for item in items[count:]:
+            self.learn(item['value'])
+        self.learnt[raw_list.get('id')] = (full_list, raw_list.get('versionId'), len(items))
+
+    def _longest_match(self, keys, start):
+        """
+        :return: (int) the position after the longest known name starting at start, or None
+        """
+        node = self.root
+        end = None
+        for position in range(start, min(len(keys), start + self.longest)):
+            node = node.get(keys[position])
+            if node is None:
+                break
+            if END in node:
+                end = position + 1
+        return end
+
+    def segment(self, utterance):
+        """
+        Longest match from left to right. Words that don't start a known name are taken
+        as items of one word and connectors between items are dropped
+        :param utterance: (string) what the user said
+        :return: (list) the item names in the order they were said
+        """
+        words = [word.strip(",.;") for word in utterance.split()]
+        words = [word for word in words if word]
+        keys = [word.lower() for word in words]
+        items = []
+        position = 0
+        while position < len(words):
+            end = self._longest_match(keys, position)
+            if end is not None:
+                items.append(" ".join(words[position:end]))
+                position = end
+                continue
+            if keys[position] not in CONNECTORS:
+                items.append(words[position])
+            position += 1
+        return items
+
+    def __len__(self):
+        return self.names
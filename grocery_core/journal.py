@@ -0,0 +1,124 @@
+"""
+An append-only journal of the changes the skill makes to a cached list. Each change is
+one short line appended next to the snapshot (groceries_<list_id>.txt.journal) instead of
+rewriting the whole snapshot, so the cost of a write depends on the size of the change
+rather than the size of the list
+"""
+import json
+import os
+
+from .item_index import GroceryIndex, normalize_name
+from .state_store import locked
+
+JOURNAL_SUFFIX = ".journal"
+
+ADD = "add"
+MOVE = "move"
+UNCROSS = "uncross"
+CREATE_CATEGORY = "create_category"
+
+
+def add_record(item_name, category_id):
+    return {'op': ADD, 'value': item_name, 'categoryId': category_id}
+
+
+def move_record(item_name, category_id):
+    return {'op': MOVE, 'value': item_name, 'categoryId': category_id}
+
+
+def uncross_record(item_name):
+    return {'op': UNCROSS, 'value': item_name}
+
+
+def create_category_record(category_name, category_id=None):
+    return {'op': CREATE_CATEGORY, 'value': category_name, 'id': category_id}
+
+
+def apply_records(data, records, index=None):
+    """
+    Replays journal records on top of a snapshot. Every operation can safely be applied
+    twice, which happens if the skill stops between compacting a snapshot and clearing
+    its journal
+    :param data: (dict) the snapshot, changed in place
+    :param records: (list) journal records
+    :param index: (GroceryIndex) an existing index over data, built if not given
+    :return: None
+    """
+    if not records:
+        return
+    if index is None:
+        index = GroceryIndex(data)
+    for record in records:
+        op = record.get('op')
+        if op == ADD:
+            index.record_added(record['value'], record.get('categoryId'))
+        elif op == MOVE:
+            index.record_moved(record['value'], record.get('categoryId'))
+        elif op == UNCROSS:
+            index.record_uncrossed(record['value'])
+        elif op == CREATE_CATEGORY and record['value'] not in index:
+            index.positions[normalize_name(record['value'])] = len(index.items)
+            index.items.append({'id': record.get('id'), 'value': record['value']})
+
+
+class Journal(object):
+    def __init__(self, state_file):
+        """
+        :param state_file: (string) the snapshot this journal belongs to
+        """
+        self.state_file = state_file
+        self.path = state_file + JOURNAL_SUFFIX
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def append(self, records):
+        """
+        Appends the records as json lines in a single synced write
+        :param records: (list) journal records
+        :return: (int) the number of bytes written
+        """
+        raw = "".join(json.dumps(record, separators=(',', ':')) + "\n" for record in records).encode('utf-8')
+        with locked(self.state_file):
+            with open(self.path, 'ab') as f:
+                f.write(raw)
+                f.flush()
+                os.fsync(f.fileno())
+        return len(raw)
+
+    def read(self, offset=0):
+        """
+        Reads the complete records written after offset. A partly written last line (the
+        skill stopped mid write) is left for a later read
+        :param offset: (int) byte position to start reading at
+        :return: (tuple) the records and the offset just past the last complete record
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                raw = f.read()
+        except OSError:
+            return [], 0
+        end = raw.rfind(b"\n") + 1
+        records = []
+        for line in raw[:end].splitlines():
+            try:
+                records.append(json.loads(line.decode('utf-8')))
+            except ValueError:
+                # A damaged record is skipped rather than losing the rest of the journal
+                continue
+        return records, offset + end
+
+    def clear(self):
+        """
+        Empties the journal once its records are part of a new snapshot
+        :return: None
+        """
+        with locked(self.state_file):
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
@@ -0,0 +1,55 @@
+"""
+An index over the user's shopping lists (the getOverview response) so a spoken list
+name can be turned into a list id without a call to OurGroceries
+"""
+from .item_index import normalize_name
+
+LIST_WORD = "list"
+
+
+class ListDirectory(object):
+    """
+    Maps every way a list is likely to be asked for to its id. For a list called
+    "Groceries" that is "groceries" and "groceries list", and for a list called
+    "Costco List" it is also "costco"
+    """
+    def __init__(self, my_lists):
+        """
+        :param my_lists: (dict) the response of get_my_lists()
+        """
+        self.my_lists = my_lists
+        self.names = {}
+        self.ids = {}
+        # The server identifies all lists in under the key "shoppingLists"
+        for shopping_list in my_lists.get('shoppingLists') or []:
+            name = normalize_name(shopping_list['name'])
+            self.names[name] = shopping_list['id']
+        for name, list_id in list(self.names.items()):
+            for variant in self._variants(name):
+                # An exact name always wins over a variant of another list's name
+                self.ids.setdefault(variant, list_id)
+        self.ids.update(self.names)
+
+    @staticmethod
+    def _variants(name):
+        words = name.split()
+        variants = [name + " " + LIST_WORD]
+        if len(words) > 1 and words[-1] == LIST_WORD:
+            variants.append(" ".join(words[:-1]))
+        return variants
+
+    def is_for(self, my_lists):
+        return self.my_lists is my_lists
+
+    def find(self, list_string):
+        """
+        :param list_string: (string) the list name as captured by Mycroft
+        :return: the list id or None if there is no such list
+        """
+        return self.ids.get(normalize_name(list_string))
+
+    def list_names(self):
+        """
+        :return: (list) the normalized names of all the shopping lists
+        """
+        return list(self.names)
@@ -0,0 +1,244 @@
+"""
+A compact read model of shopping lists and categories, used to answer questions about
+a list. A list keeps its items in columns (one Python list per field and a bytearray
+for the crossed off flags) rather than one dict per item, category ids are interned so
+every item in a category shares one string, and only the fields the skill uses are kept.
+
+The cache, the journal and the sync merge still work on the dicts OurGroceries sends,
+so a ShoppingList is built from those and held next to them: it makes the counts and
+per category listings cheap, it does not make the skill use less memory
+"""
+import sys
+
+from .item_index import normalize_name
+
+
+def intern_id(value):
+    """
+    :param value: an id from OurGroceries or None
+    :return: the interned id, so equal ids are the same object
+    """
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class GroceryItem(object):
+    """
+    One item on a list. Handed out by ShoppingList, which stores the fields in columns
+    """
+    __slots__ = ('id', 'value', 'category_id', 'crossed_off')
+
+    def __init__(self, item_id, value, category_id=None, crossed_off=False):
+        self.id = item_id
+        self.value = value
+        self.category_id = category_id
+        self.crossed_off = crossed_off
+
+    def to_dict(self):
+        """
+        :return: (dict) the item in the form the OurGroceries api uses
+        """
+        item = {'value': self.value, 'crossedOff': self.crossed_off}
+        if self.id is not None:
+            item['id'] = self.id
+        if self.category_id is not None:
+            item['categoryId'] = self.category_id
+        return item
+
+    def __repr__(self):
+        return "GroceryItem(%r, %r, %r, %r)" % (self.id, self.value, self.category_id, self.crossed_off)
+
+
+class Category(object):
+    __slots__ = ('id', 'name')
+
+    def __init__(self, category_id, name):
+        self.id = category_id
+        self.name = name
+
+    def __repr__(self):
+        return "Category(%r, %r)" % (self.id, self.name)
+
+
+class ShoppingList(object):
+    """
+    The items of one shopping list stored column by column, with an index from the
+    normalized item name to its position and running totals per category which are kept
+    up to date as items are added, moved or crossed off
+    """
+    __slots__ = ('id', 'name', 'version_id', 'refresh_date', 'ids', 'values', 'category_ids', 'crossed',
+                 'positions', 'by_category', 'left_by_category', 'crossed_total')
+
+    def __init__(self, list_id=None, name=None, version_id=None, refresh_date=None):
+        self.id = list_id
+        self.name = name
+        self.version_id = version_id
+        self.refresh_date = refresh_date
+        self.ids = []
+        self.values = []
+        self.category_ids = []
+        self.crossed = bytearray()
+        self.positions = {}
+        # category id -> positions of its items, and how many of them are not crossed off
+        self.by_category = {}
+        self.left_by_category = {}
+        self.crossed_total = 0
+
+    def append(self, item_id, value, category_id=None, crossed_off=False):
+        """
+        Adds an item to the end of the list
+        :return: (int) the position of the new item
+        """
+        position = len(self.values)
+        category_id = intern_id(category_id)
+        self.ids.append(item_id)
+        self.values.append(value)
+        self.category_ids.append(category_id)
+        self.crossed.append(1 if crossed_off else 0)
+        self.by_category.setdefault(category_id, []).append(position)
+        self._count(position, 1)
+        key = normalize_name(value)
+        current = self.positions.get(key)
+        # When an item is on the list more than once prefer the copy that is not crossed off
+        if current is None or (self.crossed[current] and not crossed_off):
+            self.positions[key] = position
+        return position
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, item_name):
+        return normalize_name(item_name) in self.positions
+
+    def __iter__(self):
+        for position in range(len(self.values)):
+            yield self.item(position)
+
+    def item(self, position):
+        """
+        :param position: (int) the position of the item in the list
+        :return: GroceryItem
+        """
+        return GroceryItem(self.ids[position], self.values[position], self.category_ids[position],
+                           bool(self.crossed[position]))
+
+    def position_of(self, item_name):
+        """
+        :param item_name: (string) the name of the item
+        :return: (int) the position of the item or None
+        """
+        return self.positions.get(normalize_name(item_name))
+
+    def find(self, item_name):
+        """
+        :param item_name: (string) the name of the item
+        :return: GroceryItem or None
+        """
+        position = self.position_of(item_name)
+        return None if position is None else self.item(position)
+
+    def _count(self, position, change):
+        """
+        Adds (change=1) or removes (change=-1) the item at position from the totals
+        """
+        if self.crossed[position]:
+            self.crossed_total += change
+        else:
+            category_id = self.category_ids[position]
+            self.left_by_category[category_id] = self.left_by_category.get(category_id, 0) + change
+
+    def set_crossed_off(self, position, crossed_off):
+        self._count(position, -1)
+        self.crossed[position] = 1 if crossed_off else 0
+        self._count(position, 1)
+
+    def set_category(self, position, category_id):
+        category_id = intern_id(category_id)
+        self._count(position, -1)
+        self.by_category[self.category_ids[position]].remove(position)
+        self.category_ids[position] = category_id
+        self.by_category.setdefault(category_id, []).append(position)
+        self._count(position, 1)
+
+    def record_added(self, item_name, category_id):
+        """
+        Mirrors GroceryIndex.record_added: an item already on the list is put back in the
+        requested category and uncrossed, otherwise a new item without an id is appended
+        :param item_name: (string) the item that was added
+        :param category_id: (string) the category it was added to
+        :return: None
+        """
+        position = self.position_of(item_name)
+        if position is None:
+            self.append(None, item_name, category_id)
+            return
+        self.ids[position] = None
+        self.values[position] = item_name
+        self.set_category(position, category_id)
+        self.set_crossed_off(position, False)
+
+    def record_uncrossed(self, item_name):
+        position = self.position_of(item_name)
+        if position is not None:
+            self.set_crossed_off(position, False)
+
+    def crossed_off_count(self):
+        return self.crossed_total
+
+    def items_left(self):
+        """
+        :return: (int) the number of items that are not crossed off
+        """
+        return len(self.values) - self.crossed_total
+
+    def items_left_in(self, category_id):
+        """
+        :param category_id: (string) the category, None for uncategorized items
+        :return: (int) the number of items in the category that are not crossed off
+        """
+        return self.left_by_category.get(category_id, 0)
+
+    def items_in_category(self, category_id, include_crossed_off=False):
+        """
+        :param category_id: (string) the category, None for uncategorized items
+        :param include_crossed_off: (bool) also return the items that are crossed off
+        :return: (list) the GroceryItems filed under the category
+        """
+        return [self.item(position) for position in self.by_category.get(category_id, ())
+                if include_crossed_off or not self.crossed[position]]
+
+    def to_response(self):
+        """
+        :return: (dict) the list in the form getList returns it, e.g. for writing to disk
+        """
+        full_list = {'list': {'id': self.id, 'name': self.name, 'versionId': self.version_id,
+                              'items': [item.to_dict() for item in self]}}
+        if self.refresh_date is not None:
+            full_list['refresh_date'] = self.refresh_date
+        return full_list
+
+
+def load_shopping_list(full_list):
+    """
+    Converts a getList response, or a cached copy of one, into a ShoppingList
+    :param full_list: (dict) the list as received from OurGroceries
+    :return: ShoppingList
+    """
+    raw_list = full_list.get('list') or {}
+    shopping_list = ShoppingList(raw_list.get('id'), raw_list.get('name'), raw_list.get('versionId'),
+                                 full_list.get('refresh_date'))
+    for item in raw_list.get('items') or []:
+        shopping_list.append(item.get('id'), item['value'], item.get('categoryId'), bool(item.get('crossedOff')))
+    return shopping_list
+
+
+def load_categories(all_categories):
+    """
+    Converts the category list, as received from OurGroceries or cached, into Categories
+    :param all_categories: (dict) the category list
+    :return: (dict) category id -> Category
+    """
+    categories = {}
+    for item in (all_categories.get('list') or {}).get('items') or []:
+        category_id = intern_id(item.get('id'))
+        categories[category_id] = Category(category_id, item['value'])
+    return categories
@@ -0,0 +1,301 @@
+"""
+A durable queue of changes waiting to be sent to OurGroceries. Intent handlers put the
+change on the queue and answer the user straight away; a worker on the event loop sends
+the changes in the background and keeps retrying with exponential backoff while the
+service can't be reached
+"""
+import asyncio
+import contextlib
+import logging
+import random
+import threading
+import time
+import uuid
+
+from .item_index import normalize_name
+from .state_store import read_state, write_state
+
+LOG = logging.getLogger(__name__)
+
+ADD_ITEM = "add_item"
+UNCROSS_ITEM = "uncross_item"
+CREATE_CATEGORY = "create_category"
+CREATE_LIST = "create_list"
+
+# Changes that are not tied to a shopping list are ordered together under this key
+NO_LIST = ""
+
+
+def _send(client, mutation):
+    """
+    :param client: the logged in OurGroceries client
+    :param mutation: (dict) a queued change
+    :return: the coroutine that sends it
+    """
+    command = mutation['command']
+    args = mutation['args']
+    if command == ADD_ITEM:
+        return client.add_item_to_list(mutation['list_id'], args['value'], args.get('category_id'))
+    if command == UNCROSS_ITEM:
+        return client.toggle_item_crossed_off(mutation['list_id'], args['item_id'], cross_off=False)
+    if command == CREATE_CATEGORY:
+        return client.create_category(args['value'])
+    if command == CREATE_LIST:
+        return client.create_list(args['value'])
+    raise ValueError("Unknown queued command %s" % command)
+
+
+class MutationQueue(object):
+    """
+    The pending changes are saved to disk (atomically, through state_store) every time
+    the queue changes so nothing is lost if the skill stops before they are sent.
+    Changes are de-duplicated and kept in order per list: a change is only sent once
+    every earlier change to the same item on that list has gone through, and a failure
+    backs off the whole list
+    """
+    def __init__(self, path, clock=time.time, retry_delay=5, max_backoff=900, max_attempts=50, limit=4,
+                 random_source=None):
+        """
+        :param path: (string) the file the queue is saved in
+        :param clock: callable returning the current time stamp in seconds
+        :param retry_delay: (float) seconds before the first retry of a failed list
+        :param max_backoff: (float) the longest a retry is ever put off
+        :param max_attempts: (int) attempts before a change is given up on
+        :param limit: (int) the most changes in flight for one list at a time
+        :param random_source: random.Random like object used for the jitter
+        """
+        self.path = path
+        self.clock = clock
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.limit = limit
+        self.random = random_source or random.Random()
+        self._lock = threading.Lock()
+        self.pending = read_state(path) or []
+        self.sent = 0
+        self.failures = 0
+        self.dropped = 0
+        self.bytes_written = 0
+        # ids of the changes being sent right now, which can no longer be replaced
+        self.in_flight = set()
+        self._wake_event = None
+        self._loop_thread = None
+        self._worker = None
+
+    def __len__(self):
+        return len(self.pending)
+
+    @staticmethod
+    def _key(list_id, command, args):
+        value = args.get('value')
+        return [list_id, command, normalize_name(value) if value else args.get('item_id')]
+
+    def enqueue(self, list_id, command, **args):
+        """
+        Saves a change to be sent to OurGroceries
+        :param list_id: (string) the list the change is for, None if it is not for a list
+        :param command: (string) one of ADD_ITEM, UNCROSS_ITEM, CREATE_CATEGORY or CREATE_LIST
+        :param args: the values the command needs
+        :return: (bool) False if the same change was already waiting to be sent
+        """
+        return self.enqueue_many([(list_id, command, args)])[0]
+
+    def enqueue_many(self, changes):
+        """
+        Saves several changes with a single write of the queue file. A change to an item that
+        is still waiting with other values (e.g. the same item under another category)
+        replaces the waiting one, the latest request wins
+        :param changes: (list) (list_id, command, args) tuples, as for enqueue
+        :return: (list) a bool for each change, False if it was already waiting to be sent
+        """
+        results = []
+        with self._lock:
+            # Worked on a copy so a failed write leaves the queue as it was on disk
+            pending = list(self.pending)
+            for list_id, command, args in changes:
+                list_id = list_id or NO_LIST
+                key = self._key(list_id, command, args)
+                same_item = [position for position, mutation in enumerate(pending) if mutation['key'] == key]
+                waiting = [position for position in same_item if pending[position]['id'] not in self.in_flight]
+                if any(pending[position]['args'] == args for position in same_item):
+                    results.append(False)
+                elif waiting:
+                    pending[waiting[0]] = dict(pending[waiting[0]], args=args)
+                    results.append(True)
+                else:
+                    # Anything for this item already on its way is followed by this change
+                    pending.append({'id': uuid.uuid4().hex, 'key': key, 'list_id': list_id, 'command': command,
+                                    'args': args, 'attempts': 0, 'next_attempt': 0})
+                    results.append(True)
+            if any(results):
+                self._save(pending)
+                self.pending = pending
+        if any(results):
+            self.wake()
+        return results
+
+    def _save(self, pending=None):
+        self.bytes_written += write_state(self.path, self.pending if pending is None else pending)
+
+    def _batches(self, now):
+        """
+        Picks the changes to send next. For each list that is not backing off, it takes
+        changes from the front of its queue, up to the limit, stopping at the first one
+        that touches an item already in the batch so changes to one item stay in order
+        :param now: (float) the current time stamp
+        :return: (list) lists of changes, one per list
+        """
+        by_list = {}
+        for mutation in self.pending:
+            by_list.setdefault(mutation['list_id'], []).append(mutation)
+        batches = []
+        for mutations in by_list.values():
+            if mutations[0]['next_attempt'] > now:
+                continue
+            batch = []
+            items = set()
+            for mutation in mutations:
+                item = mutation['key'][2]
+                if len(batch) >= self.limit or item in items:
+                    break
+                items.add(item)
+                batch.append(mutation)
+            batches.append(batch)
+        return batches
+
+    async def drain(self, client):
+        """
+        Sends every change that is due, lists at the same time, and keeps going until
+        nothing more is due
+        :param client: the logged in OurGroceries client
+        :return: (int) the number of changes sent
+        """
+        sent = 0
+        while True:
+            batches = self._batches(self.clock())
+            if not batches:
+                return sent
+            results = await asyncio.gather(*[self._send_batch(client, batch) for batch in batches])
+            sent += sum(results)
+            if not any(results):
+                # Everything that was due failed, wait for the backoff
+                return sent
+
+    async def _send_batch(self, client, batch):
+        with self._lock:
+            self.in_flight.update(mutation['id'] for mutation in batch)
+        try:
+            results = await asyncio.gather(*[_send(client, mutation) for mutation in batch],
+                                           return_exceptions=True)
+        finally:
+            with self._lock:
+                self.in_flight.difference_update(mutation['id'] for mutation in batch)
+        done = []
+        failed = []
+        for mutation, result in zip(batch, results):
+            if isinstance(result, Exception):
+                LOG.warning("Could not send %s to OurGroceries: %s" % (mutation['command'], result))
+                failed.append(mutation)
+            else:
+                done.append(mutation['id'])
+        with self._lock:
+            self.pending = [mutation for mutation in self.pending if mutation['id'] not in done]
+            self.sent += len(done)
+            if failed:
+                self.failures += 1
+                self._back_off(batch[0]['list_id'], failed)
+            self._save()
+        return len(done)
+
+    def _back_off(self, list_id, failed):
+        for mutation in failed:
+            mutation['attempts'] += 1
+        attempts = max(mutation['attempts'] for mutation in failed)
+        delay = min(self.max_backoff, self.retry_delay * 2 ** (attempts - 1))
+        next_attempt = self.clock() + delay * self.random.uniform(0.8, 1.2)
+        given_up = [mutation['id'] for mutation in failed if mutation['attempts'] >= self.max_attempts]
+        if given_up:
+            LOG.error("Giving up on %s changes after %s attempts" % (len(given_up), self.max_attempts))
+            self.dropped += len(given_up)
+            self.pending = [mutation for mutation in self.pending if mutation['id'] not in given_up]
+        for mutation in self.pending:
+            if mutation['list_id'] == list_id:
+                mutation['next_attempt'] = next_attempt
+
+    def next_due(self):
+        """
+        :return: (float) seconds until the next change is due, None if the queue is empty
+        """
+        with self._lock:
+            if not self.pending:
+                return None
+            next_attempt = min(mutation['next_attempt'] for mutation in self.pending)
+        return max(0, next_attempt - self.clock())
+
+    def start(self, loop_thread, get_client):
+        """
+        Starts the background worker on the event loop
+        :param loop_thread: (EventLoopThread) the loop the worker runs on
+        :param get_client: callable returning the logged in client, or None if there isn't one yet.
+                           It is called off the event loop, so it may log in
+        :return: None
+        """
+        if self._worker is not None:
+            return
+        self._loop_thread = loop_thread
+        self._worker = loop_thread.submit(self._run_worker(get_client))
+
+    async def _run_worker(self, get_client):
+        self._worker_task = asyncio.current_task()
+        self._wake_event = asyncio.Event()
+        # Set when the last round could not send anything, so the worker doesn't spin on
+        # changes that are due but can't go out yet
+        pause = 0
+        while True:
+            timeout = self.next_due()
+            if timeout is not None:
+                timeout = max(timeout, pause)
+            try:
+                await asyncio.wait_for(self._wake_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake_event.clear()
+            pause = 0
+            if not self.pending:
+                continue
+            # Logging in blocks on requests that run on this loop
+            client = await asyncio.get_running_loop().run_in_executor(None, get_client)
+            if client is None:
+                # Nothing can be sent before there is a login
+                pause = self.retry_delay
+                continue
+            try:
+                await self.drain(client)
+            except Exception as error:
+                LOG.exception("Mutation queue worker error: %s" % error)
+                pause = self.retry_delay
+
+    def wake(self):
+        """
+        Tells the worker there is something new to send. Safe to call from any thread
+        :return: None
+        """
+        if self._loop_thread is not None and self._wake_event is not None:
+            self._loop_thread.loop.call_soon_threadsafe(self._wake_event.set)
+
+    def stop(self):
+        """
+        Stops the worker. Anything still queued stays on disk for next time
+        :return: None
+        """
+        if self._worker is None:
+            return
+        if self._loop_thread.is_running():
+            self._loop_thread.run(self._stop_worker())
+        self._worker = None
+
+    async def _stop_worker(self):
+        self._worker_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._worker_task
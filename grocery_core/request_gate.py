@@ -0,0 +1,161 @@
+"""
+Sits in front of every request the client sends to OurGroceries. Identical reads that
+are in flight at the same time share one request, all requests together are held to a
+concurrency and a rate limit, and when OurGroceries says to slow down a read is answered
+with the last response it gave instead of failing
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+
+LOG = logging.getLogger(__name__)
+
+# Commands that only read, which are safe to share and to answer from an earlier response
+READ_COMMANDS = frozenset(("getOverview", "getList"))
+DEFAULT_LIMIT = 4
+DEFAULT_RATE = 20.0
+DEFAULT_BURST = 20
+DEFAULT_COOLDOWN = 2.0
+MAX_REMEMBERED = 32
+
+
+class RateLimitedException(Exception):
+    """
+    OurGroceries answered with HTTP 429
+    """
+    def __init__(self, message, retry_after=None):
+        Exception.__init__(self, message)
+        self.retry_after = retry_after
+
+
+class RequestGate(object):
+    """
+    Single-flight reads plus a token bucket rate limit. Responses to reads are remembered
+    as JSON text, so every caller gets its own copy to change as it likes
+    """
+    def __init__(self, limit=DEFAULT_LIMIT, rate=DEFAULT_RATE, burst=DEFAULT_BURST, cooldown=DEFAULT_COOLDOWN,
+                 clock=time.monotonic):
+        """
+        :param limit: (int) the most requests in flight at once
+        :param rate: (float) requests per second allowed on average, 0 for no limit
+        :param burst: (int) requests that may go out back to back before the rate applies
+        :param cooldown: (float) seconds to hold all requests after being rate limited,
+                         unless the server says how long
+        :param clock: (function) returns a monotonic time in seconds
+        """
+        self.limit = limit
+        self.rate = rate
+        self.burst = burst
+        self.cooldown = cooldown
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+        self.blocked_until = 0
+        self.in_flight = {}
+        self.last_good = OrderedDict()
+        # Bumped by every write so a read started before it is never shared after it
+        self.generation = 0
+        self._semaphore = None
+        self.requests = 0
+        self.coalesced = 0
+        self.served_stale = 0
+        self.rate_limited = 0
+        self.seconds_waited = 0.0
+
+    async def call(self, command, other_payload, send):
+        """
+        Sends one command through the gate
+        :param command: (string) the OurGroceries api command
+        :param other_payload: (dict) the fields of the command, used to spot identical reads
+        :param send: (function) returns the coroutine that sends the command
+        :return: the decoded json response
+        """
+        if command not in READ_COMMANDS:
+            try:
+                return await self._limited(send)
+            finally:
+                self.generation += 1
+        read_key = (command, json.dumps(other_payload or {}, sort_keys=True))
+        key = read_key + (self.generation,)
+        shared = self.in_flight.get(key)
+        if shared is not None:
+            self.coalesced += 1
+            return json.loads(await asyncio.shield(shared))
+        shared = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = shared
+        try:
+            try:
+                response = await self._limited(send)
+            except RateLimitedException:
+                text = self.last_good.get(read_key)
+                if text is None:
+                    raise
+                self.served_stale += 1
+                LOG.info("Rate limited by OurGroceries, answering %s from the last response" % command)
+                shared.set_result(text)
+                return json.loads(text)
+            text = json.dumps(response, separators=(',', ':'))
+            shared.set_result(text)
+            self._remember(read_key, text)
+            return response
+        except asyncio.CancelledError:
+            shared.cancel()
+            raise
+        except Exception as error:
+            if not shared.done():
+                shared.set_exception(error)
+                # Nobody may be waiting on it, don't let asyncio complain about that
+                shared.exception()
+            raise
+        finally:
+            self.in_flight.pop(key, None)
+
+    def _remember(self, read_key, text):
+        self.last_good[read_key] = text
+        self.last_good.move_to_end(read_key)
+        while len(self.last_good) > MAX_REMEMBERED:
+            self.last_good.popitem(last=False)
+
+    async def _limited(self, send):
+        if self._semaphore is None:
+            # Created here because it has to belong to the loop the requests run on
+            self._semaphore = asyncio.Semaphore(self.limit)
+        async with self._semaphore:
+            await self._wait_for_turn()
+            self.requests += 1
+            try:
+                return await send()
+            except RateLimitedException as error:
+                self.rate_limited += 1
+                self.blocked_until = self.clock() + (error.retry_after or self.cooldown)
+                raise
+
+    async def _wait_for_turn(self):
+        """
+        Waits until the token bucket has a token, and past any cooldown
+        :return: None
+        """
+        while True:
+            now = self.clock()
+            if now < self.blocked_until:
+                delay = self.blocked_until - now
+            elif self.rate <= 0:
+                return
+            else:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            self.seconds_waited += delay
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        return {'requests': self.requests,
+                'coalesced': self.coalesced,
+                'served_stale': self.served_stale,
+                'rate_limited': self.rate_limited,
+                'seconds_waited': round(self.seconds_waited, 3)}
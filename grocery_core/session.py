@@ -0,0 +1,125 @@
+"""
+Keeps a single logged in OurGroceries session alive for the life of the skill so
+that intents do not have to pay for a full login round trip every time they fire
+"""
+import logging
+import threading
+
+from .event_loop import EventLoopThread
+from .request_gate import RequestGate
+
+LOG = logging.getLogger(__name__)
+
+
+class GrocerySession(object):
+    """
+    Owns the OurGroceries client and the background event loop it runs on. The skill
+    asks for a connection at the start of every intent and only the first one logs in
+    """
+    def __init__(self, client_factory=None, loop_thread=None, metrics=None):
+        """
+        :param client_factory: (function) makes a client from a user name and password,
+                               defaults to PooledOurGroceries
+        :param loop_thread: (EventLoopThread) the loop to run on, a new one by default
+        :param metrics: (Metrics) times every call the clients make
+        """
+        self.client_factory = client_factory
+        self.metrics = metrics
+        # Kept here rather than on the client so the limits outlive a change of login
+        self.gate = RequestGate()
+        self.client = None
+        self.credentials = None
+        self.loop_thread = loop_thread or EventLoopThread()
+        self.connections_requested = 0
+        self.logins_avoided = 0
+        # Intents and the background sync can ask for a connection at the same time
+        self._lock = threading.Lock()
+
+    def connect(self, username, password, timeout=None):
+        """
+        Returns a logged in client. A new login only happens the first time or when
+        the credentials in the skill settings have changed
+        :param username: (string) the OurGroceries user name
+        :param password: (string) the OurGroceries password
+        :param timeout: (float) seconds to wait for the login before giving up
+        :return: PooledOurGroceries
+        """
+        with self._lock:
+            self.connections_requested += 1
+            if self.client is None or self.credentials != (username, password):
+                if self.client is not None:
+                    self.run(self.client.close())
+                if self.client_factory is None:
+                    # The library and aiohttp are only loaded once a connection is needed
+                    from .client import PooledOurGroceries
+                    self.client_factory = PooledOurGroceries
+                self.client = self.client_factory(username, password)
+                self.client.metrics = self.metrics
+                self.client.gate = self.gate
+                self.credentials = (username, password)
+                try:
+                    self.run(self.client.login(), timeout)
+                except Exception:
+                    # A client that never logged in is not reused, the next connect tries again
+                    self.run(self.client.close())
+                    self.client = None
+                    self.credentials = None
+                    raise
+            else:
+                self.logins_avoided += 1
+                LOG.debug("Reusing OurGroceries session, %s logins avoided so far" % self.logins_avoided)
+            return self.client
+
+    def run(self, coroutine, timeout=None):
+        """
+        Runs the coroutine on the background event loop and waits for the result.
+        The loop lives as long as the session because the pooled connection belongs to it
+        :param coroutine: the awaitable to run
+        :param timeout: (float) seconds to wait before giving up
+        :return: the result of the coroutine
+        """
+        return self.loop_thread.run(coroutine, timeout)
+
+    def submit(self, coroutine):
+        """
+        Starts the coroutine on the background event loop without waiting for it
+        :param coroutine: the awaitable to run
+        :return: concurrent.futures.Future for the result
+        """
+        return self.loop_thread.submit(coroutine)
+
+    def run_all(self, coroutines, timeout=None, return_exceptions=False, limit=None):
+        """
+        Runs independent requests at the same time instead of one after another
+        :param coroutines: iterable of awaitables
+        :param timeout: (float) seconds to wait for the whole group
+        :param return_exceptions: (bool) return exceptions in place of results instead of raising
+        :param limit: (int) the most requests allowed in flight at once, None for no limit
+        :return: list of results in the same order as the coroutines
+        """
+        return self.loop_thread.run_all(coroutines, timeout, return_exceptions, limit)
+
+    @property
+    def logins(self):
+        if self.client is None:
+            return 0
+        return self.client.login_count
+
+    @property
+    def relogins(self):
+        if self.client is None:
+            return 0
+        return self.client.relogin_count
+
+    def stats(self):
+        return {'connections_requested': self.connections_requested,
+                'logins': self.logins,
+                'relogins': self.relogins,
+                'logins_avoided': self.logins_avoided,
+                'gate': self.gate.stats()}
+
+    def close(self):
+        if self.client is not None:
+            self.run(self.client.close())
+            self.client = None
+        self.loop_thread.stop()
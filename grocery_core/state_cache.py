@@ -0,0 +1,301 @@
+"""
+Keeps the parsed grocery and category state files in memory so an intent does not have
+to parse them from disk every time it runs
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .journal import Journal, apply_records
+from .state_store import compress_state, decode_state, encode_state, write_bytes_atomically
+
+TIME_HEADING_IN_DICT = 'refresh_date'
+DEFAULT_TTL_SECONDS = {'groceries': 600, 'categories': 600, 'lists': 3600}
+
+FRESH = 'fresh'
+STALE = 'stale'
+EXPIRED = 'expired'
+
+
+class CacheEntry(object):
+    def __init__(self, object_type, data, mtime, size, digest=None):
+        self.object_type = object_type
+        self.data = data
+        self.mtime = mtime
+        self.size = size
+        # hash of the bytes last written, used to skip rewriting an unchanged file
+        self.digest = digest
+        # how much of the journal has been applied to data
+        self.journal_offset = 0
+
+    @property
+    def refresh_date(self):
+        return self.data.get(TIME_HEADING_IN_DICT)
+
+
+class StateCache(object):
+    """
+    In-process cache of the state files. Each entry is keyed by the state file, whose name
+    is made from the list id and object type (groceries_<list_id>.txt, grocery_categories.txt,
+    shopping_lists.txt).
+    The file's mtime is checked on every read so the file is only parsed again when some
+    other process has changed it. When the cached files add up to more than max_bytes the
+    least recently used lists are dropped from memory. Files are written through
+    state_store, so writes are atomic and a write that would not change the file is skipped.
+    Small changes are appended to a journal next to the snapshot (see journal.py) which is
+    replayed on load and folded into a new snapshot when the list is stored again or the
+    journal grows past journal_compact_bytes.
+    Ages are measured with the clock passed in (wall clock time by default, because the
+    time stamps are shared with other processes through the state files)
+    """
+    def __init__(self, ttl_seconds=None, max_bytes=4 * 1024 * 1024, stale_seconds=0, clock=time.time,
+                 compress=False, journal_compact_bytes=64 * 1024):
+        """
+        :param ttl_seconds: (dict) seconds a list stays fresh for each object type
+        :param max_bytes: (int) roughly how much memory the cached lists may use, measured by the size of their json
+        :param stale_seconds: (float) seconds past the TTL a list may still be served while it is refreshed
+        :param clock: callable returning the current time stamp in seconds
+        :param compress: (bool) gzip the state files
+        :param journal_compact_bytes: (int) journal size at which it is folded into a new snapshot
+        """
+        self.ttl_seconds = dict(DEFAULT_TTL_SECONDS)
+        if ttl_seconds:
+            self.ttl_seconds.update(ttl_seconds)
+        self.max_bytes = max_bytes
+        self.stale_seconds = stale_seconds
+        self.clock = clock
+        self.compress = compress
+        self.journal_compact_bytes = journal_compact_bytes
+        self._lock = threading.RLock()
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_written = 0
+        self.writes_skipped = 0
+        self.journal_bytes_written = 0
+        self.compactions = 0
+
+    def load(self, state_file, object_type):
+        """
+        Returns the parsed state file, from memory when the file has not changed on disk
+        :param state_file: (string) the path of the state file
+        :param object_type: (string) either groceries or categories
+        :return: (dict) the cached list or None if there is no state file
+        """
+        with self._lock:
+            try:
+                stat = os.stat(state_file)
+            except OSError:
+                self._evict(state_file)
+                return None
+            journal = Journal(state_file)
+            entry = self.entries.get(state_file)
+            if entry is not None and entry.mtime == stat.st_mtime_ns and journal.size() >= entry.journal_offset:
+                self.hits += 1
+                self.entries.move_to_end(state_file)
+                # Pick up anything another process has appended to the journal since
+                records, entry.journal_offset = journal.read(entry.journal_offset)
+                apply_records(entry.data, records)
+                return entry.data
+            self.misses += 1
+            with open(state_file, 'rb') as f:
+                data, size = decode_state(f.read())
+            if data is None:
+                # Corrupt or written by an older version of the skill, throw it away
+                self._evict(state_file)
+                journal.clear()
+                return None
+            records, journal_offset = journal.read()
+            apply_records(data, records)
+            self._remember(state_file, object_type, data, stat, size)
+            self.entries[state_file].journal_offset = journal_offset
+            return data
+
+    def store(self, state_file, object_type, data):
+        """
+        Writes the list to its state file and keeps the parsed copy in memory
+        :param state_file: (string) the path of the state file
+        :param object_type: (string) either groceries or categories
+        :param data: (dict) the list to save
+        :return: None
+        """
+        payload = encode_state(data)
+        digest = hashlib.sha1(payload).digest()
+        with self._lock:
+            entry = self.entries.get(state_file)
+            journal = Journal(state_file)
+            if entry is not None and entry.digest == digest and self._unchanged_on_disk(state_file, entry):
+                # Nothing changed, save the SD card a write
+                self.writes_skipped += 1
+                entry.data = data
+            else:
+                raw = compress_state(payload) if self.compress else payload
+                write_bytes_atomically(state_file, raw)
+                self.bytes_written += len(raw)
+                self._remember(state_file, object_type, data, os.stat(state_file), len(payload), digest)
+            # The snapshot now holds every change, so the journal is no longer needed
+            if journal.size():
+                journal.clear()
+
+    def update(self, state_file, object_type, change):
+        """
+        Replaces the cached list with a new one made from it, for changes worked out away
+        from the threads using the list. The list the change is given is the current one,
+        journal included, and nothing else can be saved until the new one is
+        :param state_file: (string) the path of the state file
+        :param object_type: (string) either groceries or categories
+        :param change: (function) takes the cached list (None if there is none), which it must
+                       not change, and returns the list to save in its place or None to keep it
+        :return: (dict) the list now cached
+        """
+        with self._lock:
+            current = self.load(state_file, object_type)
+            data = change(current)
+            if data is None:
+                return current
+            self.store(state_file, object_type, data)
+            return data
+
+    def append(self, state_file, object_type, data, records):
+        """
+        Records changes that have already been made to data in memory by appending them to
+        the journal instead of rewriting the whole snapshot. If the cached list is no longer
+        data, because it was refreshed or another process rewrote it in the meantime, the
+        changes are made to the cached list instead so the newer copy is kept
+        :param state_file: (string) the path of the state file
+        :param object_type: (string) either groceries or categories
+        :param data: (dict) the list, already containing the changes
+        :param records: (list) journal records describing the changes
+        :return: None
+        """
+        if not records:
+            return
+        with self._lock:
+            # Also catches up with anything another process wrote first so the offset stays right
+            current = self.load(state_file, object_type)
+            if current is None:
+                # There is no snapshot on disk that these changes apply to
+                self.store(state_file, object_type, data)
+                return
+            if current is not data:
+                apply_records(current, records)
+            entry = self.entries[state_file]
+            written = Journal(state_file).append(records)
+            self.journal_bytes_written += written
+            entry.journal_offset += written
+            if entry.journal_offset > self.journal_compact_bytes:
+                self.compactions += 1
+                self.store(state_file, object_type, current)
+
+    @staticmethod
+    def _unchanged_on_disk(state_file, entry):
+        try:
+            return os.stat(state_file).st_mtime_ns == entry.mtime
+        except OSError:
+            return False
+
+    def expire(self, state_file, object_type):
+        """
+        Marks the cached list as out of date so the next read downloads it again, while
+        keeping it, journal included, to fall back on if that download fails
+        :param state_file: (string) the path of the state file
+        :param object_type: (string) either groceries or categories
+        :return: None
+        """
+        with self._lock:
+            current = self.load(state_file, object_type)
+            if current is None or current.get(TIME_HEADING_IN_DICT) is None:
+                return
+            # Only the time stamp changes, so a list an intent is holding stays usable
+            current[TIME_HEADING_IN_DICT] = None
+            self.store(state_file, object_type, current)
+
+    def invalidate(self, state_file):
+        """
+        Forgets a cached list both in memory and on disk so the next read downloads it again
+        :param state_file: (string) the path of the state file
+        :return: None
+        """
+        with self._lock:
+            self._evict(state_file)
+            try:
+                os.remove(state_file)
+            except OSError:
+                pass
+            Journal(state_file).clear()
+
+    def now(self):
+        return self.clock()
+
+    def age(self, data, now=None):
+        """
+        :param data: (dict) a cached list
+        :param now: (float) the current timestamp, the cache's clock is used if not given
+        :return: (float) seconds since the list was downloaded, None when that is unknown
+        """
+        refresh_date = data.get(TIME_HEADING_IN_DICT)
+        if refresh_date is None:
+            return None
+        if now is None:
+            now = self.now()
+        return now - refresh_date
+
+    def freshness(self, data, object_type, now=None):
+        """
+        :param data: (dict) a cached list
+        :param object_type: (string) either groceries or categories
+        :param now: (float) the current timestamp, the cache's clock is used if not given
+        :return: FRESH when younger than the TTL, STALE when it may be served while it is
+            refreshed in the background, otherwise EXPIRED
+        """
+        age = self.age(data, now)
+        # A list without a time stamp can't be trusted
+        if age is None:
+            return EXPIRED
+        ttl = self.ttl_seconds.get(object_type, DEFAULT_TTL_SECONDS['groceries'])
+        if age <= ttl:
+            return FRESH
+        if age <= ttl + self.stale_seconds:
+            return STALE
+        return EXPIRED
+
+    def is_fresh(self, data, object_type, now=None):
+        """
+        :param data: (dict) a cached list
+        :param object_type: (string) either groceries or categories
+        :param now: (float) the current timestamp, the cache's clock is used if not given
+        :return: (bool) True if the list is younger than the TTL for its type
+        """
+        return self.freshness(data, object_type, now) == FRESH
+
+    def _remember(self, state_file, object_type, data, stat, size, digest=None):
+        self._evict(state_file)
+        self.entries[state_file] = CacheEntry(object_type, data, stat.st_mtime_ns, size, digest)
+        self.total_bytes += size
+        # Never evict the list that was just loaded, the caller is about to use it
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            oldest = next(iter(self.entries))
+            self._evict(oldest)
+
+    def _evict(self, state_file):
+        entry = self.entries.pop(state_file, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self.entries),
+                'bytes_in_memory': self.total_bytes,
+                'bytes_written': self.bytes_written,
+                'writes_skipped': self.writes_skipped,
+                'journal_bytes_written': self.journal_bytes_written,
+                'compactions': self.compactions}
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.total_bytes = 0
@@ -0,0 +1,126 @@
+"""
+Reads and writes the state files. Writes go to a temporary file which is synced and then
+renamed over the old file, so a crash part way through never leaves a truncated file behind
+"""
+import contextlib
+import gzip
+import json
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, writers are still atomic but not serialised
+    fcntl = None
+
+# Bump this whenever the layout of the cached data changes so old caches are thrown away
+SCHEMA_VERSION = 1
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def encode_state(data, compress=False):
+    """
+    :param data: (dict) the list to save
+    :param compress: (bool) gzip the encoded json
+    :return: (bytes) the contents of the state file
+    """
+    envelope = {'schema': SCHEMA_VERSION, 'data': data}
+    raw = json.dumps(envelope, separators=(',', ':')).encode('utf-8')
+    if compress:
+        raw = compress_state(raw)
+    return raw
+
+
+def compress_state(raw):
+    """
+    :param raw: (bytes) encoded state
+    :return: (bytes) the gzipped state, mtime=0 keeps the output identical for identical data
+    """
+    return gzip.compress(raw, mtime=0)
+
+
+def decode_state(raw):
+    """
+    :param raw: (bytes) the contents of a state file, gzipped or not
+    :return: (tuple) the saved list and the size of its json, or (None, 0) when the
+        file is corrupt or was written with another schema version
+    """
+    try:
+        if raw[:2] == GZIP_MAGIC:
+            raw = gzip.decompress(raw)
+        envelope = json.loads(raw.decode('utf-8'))
+    except (OSError, EOFError, ValueError):
+        return None, 0
+    if not isinstance(envelope, dict) or envelope.get('schema') != SCHEMA_VERSION:
+        return None, 0
+    return envelope.get('data'), len(raw)
+
+
+def read_state(state_file):
+    """
+    :param state_file: (string) the path of the state file
+    :return: (dict) the saved list or None if it is missing, corrupt or out of date
+    """
+    try:
+        with open(state_file, 'rb') as f:
+            raw = f.read()
+    except OSError:
+        return None
+    return decode_state(raw)[0]
+
+
+@contextlib.contextmanager
+def locked(state_file):
+    """
+    Holds an exclusive lock on the directory of the state file so that two processes
+    writing the same state file take turns. Locking the directory, which always exists,
+    means no lock file is left behind next to every state file
+    :param state_file: (string) the path of the state file
+    """
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(state_file)), os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
+
+
+def write_bytes_atomically(state_file, raw):
+    """
+    Writes to a temporary file in the same directory, syncs it and renames it into place
+    :param state_file: (string) the path of the state file
+    :param raw: (bytes) the new contents
+    :return: None
+    """
+    directory = os.path.dirname(os.path.abspath(state_file))
+    with locked(state_file):
+        fd, temp_file = tempfile.mkstemp(prefix=".%s." % os.path.basename(state_file), dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(raw)
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp only gives the owner access, match what open() would have created
+            os.chmod(temp_file, 0o644)
+            os.replace(temp_file, state_file)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temp_file)
+            raise
+
+
+def write_state(state_file, data, compress=False):
+    """
+    :param state_file: (string) the path of the state file
+    :param data: (dict) the list to save
+    :param compress: (bool) gzip the encoded json
+    :return: (int) the number of bytes written
+    """
+    raw = encode_state(data, compress)
+    write_bytes_atomically(state_file, raw)
+    return len(raw)
@@ -0,0 +1,225 @@
+"""
+Keeps cached shopping lists in step with OurGroceries without downloading lists that
+have not changed. Every list carries a versionId which the server bumps on each change
+and which is also part of the small getOverview response, so comparing the two tells
+us whether the full list needs to be fetched at all
+"""
+import asyncio
+import json
+import logging
+import time
+
+from .item_index import normalize_name
+
+LOG = logging.getLogger(__name__)
+
+# Several lists synced together share one overview request, but a list is only taken
+# to be current from an overview fetched after it was asked for
+DEFAULT_OVERVIEW_MAX_AGE = 0
+
+
+def list_version(full_list):
+    """
+    :param full_list: (dict) a list as received from OurGroceries
+    :return: the versionId of the list or None
+    """
+    if not full_list:
+        return None
+    return (full_list.get('list') or {}).get('versionId')
+
+
+def overview_versions(my_lists):
+    """
+    :param my_lists: (dict) the response of get_my_lists()
+    :return: (dict) list id -> versionId
+    """
+    return {shopping_list['id']: shopping_list.get('versionId')
+            for shopping_list in (my_lists or {}).get('shoppingLists') or []}
+
+
+def copy_list(full_list):
+    """
+    :param full_list: (dict) a list as received from OurGroceries
+    :return: (dict) a copy that can be changed without touching the items of the original
+    """
+    copied = dict(full_list)
+    copied['list'] = dict(full_list['list'])
+    copied['list']['items'] = [dict(item) for item in full_list['list']['items']]
+    return copied
+
+
+def merge_list(cached, fresh, index=None):
+    """
+    Brings the cached list up to date with a freshly downloaded copy. Items that did not
+    change are left alone, so the dicts an index points at stay valid, and only items
+    that were added, changed or removed are touched
+    :param cached: (dict) the cached list, updated in place
+    :param fresh: (dict) the list as just received from OurGroceries
+    :param index: (GroceryIndex) the index over the cached list, kept up to date
+    :return: (tuple) the number of items added, changed and removed
+    """
+    items = cached['list']['items']
+    fresh_items = fresh['list']['items']
+    by_id = {item['id']: item for item in items if 'id' in item}
+    fresh_ids = set()
+    fresh_names = set()
+    added = changed = 0
+    first_new = len(items)
+    for item in fresh_items:
+        fresh_ids.add(item['id'])
+        fresh_names.add(normalize_name(item['value']))
+        current = by_id.get(item['id'])
+        if current is None:
+            items.append(item)
+            added += 1
+        elif current != item:
+            current.clear()
+            current.update(item)
+            changed += 1
+    # Items without an id were added by the skill and are dropped once the server has them
+    kept = [item for item in items
+            if item.get('id') in fresh_ids
+            or ('id' not in item and normalize_name(item['value']) not in fresh_names)]
+    removed = len(items) - len(kept)
+    if removed:
+        items[:] = kept
+    for key, value in fresh['list'].items():
+        if key != 'items':
+            cached['list'][key] = value
+    if index is not None:
+        if removed or changed:
+            # Positions or names have moved, the index has to start over
+            index.rebuild()
+        else:
+            for position in range(first_new, len(items)):
+                index.index_item(position)
+    return added, changed, removed
+
+
+class SyncEngine(object):
+    """
+    Fetches shopping lists only when their version has moved on and merges the
+    downloaded copy into the cached one. Counts what was downloaded and what was saved
+    """
+    def __init__(self, overview_max_age=DEFAULT_OVERVIEW_MAX_AGE, clock=time.time, gate=None):
+        """
+        :param overview_max_age: (int) seconds an overview is reused for before asking again
+        :param clock: (function) returns the current time stamp
+        :param gate: (RequestGate) the gate writes go through, an overview is never reused
+                     once a write has been sent after it
+        """
+        self.overview_max_age = overview_max_age
+        self.clock = clock
+        self.gate = gate
+        self.overview = None
+        self.overview_time = 0
+        # The gate's write generation when the overview was requested
+        self.overview_generation = 0
+        self._overview_lock = None
+        self.downloads = 0
+        self.skipped = 0
+        self.overview_requests = 0
+        self.bytes_transferred = 0
+        self.bytes_saved = 0
+        self.seconds = 0.0
+
+    async def _timed(self, request):
+        """
+        Runs one request against OurGroceries and records its size and duration
+        :param request: the coroutine to run
+        :return: the response
+        """
+        started = time.perf_counter()
+        try:
+            response = await request
+        finally:
+            self.seconds += time.perf_counter() - started
+        # The library only hands back the parsed body, its JSON size is close enough
+        self.bytes_transferred += len(json.dumps(response, separators=(',', ':')))
+        return response
+
+    async def fetch_overview(self, client, max_age=None):
+        """
+        Returns the overview of all lists. Callers that arrive while a fetch is in flight
+        wait for it instead of sending another. An overview from before the call is only
+        reused when it is younger than max_age and no write has been sent since
+        :param client: (OurGroceries) the logged in client
+        :param max_age: (int) seconds an earlier overview may be reused, 0 never reuses one
+        :return: (dict) the response of get_my_lists()
+        """
+        if max_age is None:
+            max_age = self.overview_max_age
+        if self._overview_lock is None:
+            self._overview_lock = asyncio.Lock()
+        requested_at = self.clock()
+        async with self._overview_lock:
+            generation = self._write_generation()
+            # Anything fetched after this call started is as good as fetching it now
+            if (self.overview is not None and self.overview_generation == generation and
+                    (self.overview_time >= requested_at or requested_at - self.overview_time < max_age)):
+                return self.overview
+            overview = await self._timed(client.get_my_lists())
+            self.overview_requests += 1
+            self.overview = overview
+            self.overview_time = self.clock()
+            self.overview_generation = generation
+            return overview
+
+    def _write_generation(self):
+        return self.gate.generation if self.gate is not None else 0
+
+    async def fetch_changes(self, client, list_id, cached=None):
+        """
+        Downloads one shopping list unless the cached copy has the version the server reports
+        :param client: (OurGroceries) the logged in client
+        :param list_id: (string) the shopping list to sync
+        :param cached: (dict) the cached copy of the list or None
+        :return: (dict) the list as downloaded, None when the cached copy is still current
+        """
+        cached_version = list_version(cached)
+        if cached_version is not None:
+            overview = await self.fetch_overview(client)
+            if overview_versions(overview).get(list_id) == cached_version:
+                self.skipped += 1
+                self.bytes_saved += len(json.dumps(cached['list'], separators=(',', ':')))
+                LOG.debug("List %s is still at version %s, not downloading it" % (list_id, cached_version))
+                return None
+        fresh = await self._timed(client.get_list_items(list_id=list_id))
+        self.downloads += 1
+        return fresh
+
+    async def sync_list(self, client, list_id, cached=None, index=None):
+        """
+        Brings one shopping list up to date. When the cached copy has the version the
+        server reports, nothing is downloaded; otherwise the list is fetched and merged
+        into the cached copy. Only for callers that own the cached copy, see fetch_changes
+        :param client: (OurGroceries) the logged in client
+        :param list_id: (string) the shopping list to sync
+        :param cached: (dict) the cached copy of the list or None
+        :param index: (GroceryIndex) the index over the cached copy, kept up to date
+        :return: (dict) the up to date list, which is the cached dict when there was one
+        """
+        fresh = await self.fetch_changes(client, list_id, cached)
+        if fresh is None:
+            return cached
+        if cached is None or 'list' not in cached:
+            return fresh
+        added, changed, removed = merge_list(cached, fresh, index)
+        LOG.debug("Merged list %s: %s added, %s changed, %s removed" % (list_id, added, changed, removed))
+        return cached
+
+    def forget_overview(self):
+        """
+        Makes the next overview request go to OurGroceries, used when lists were created
+        or another skill changed a list
+        :return: None
+        """
+        self.overview = None
+
+    def stats(self):
+        return {'downloads': self.downloads,
+                'downloads_skipped': self.skipped,
+                'overview_requests': self.overview_requests,
+                'bytes_transferred': self.bytes_transferred,
+                'bytes_saved': self.bytes_saved,
+                'seconds': round(self.seconds, 3)}
@@ -0,0 +1,50 @@
+"""
+Works out when the skill should next refresh its cached lists in the background
+"""
+import random
+
+
+class SyncSchedule(object):
+    """
+    Every delay is jittered so that many devices on one account, which tend to boot and
+    sync at the same moment, spread their requests out. After a failed sync the delay
+    backs off exponentially instead of retrying at the normal interval
+    """
+    def __init__(self, interval, jitter=0.2, retry_delay=60, max_backoff=3600, initial_delay=(5, 30),
+                 random_source=None):
+        """
+        :param interval: (float) seconds between syncs while they are succeeding
+        :param jitter: (float) fraction of the delay that is randomised in either direction
+        :param retry_delay: (float) seconds before the first retry after a failure
+        :param max_backoff: (float) the longest a retry is ever put off
+        :param initial_delay: (tuple) range of seconds to wait before prefetching after load
+        :param random_source: random.Random like object, used to make the jitter repeatable
+        """
+        self.interval = interval
+        self.jitter = jitter
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self.initial_delay = initial_delay
+        self.random = random_source or random.Random()
+        self.failures = 0
+
+    def _jittered(self, delay):
+        return delay * self.random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def first_delay(self):
+        """
+        :return: (float) seconds to wait before prefetching after the skill has loaded
+        """
+        return self.random.uniform(*self.initial_delay)
+
+    def next_delay(self, succeeded):
+        """
+        :param succeeded: (bool) whether the sync that just ran worked
+        :return: (float) seconds until the next sync
+        """
+        if succeeded:
+            self.failures = 0
+            return self._jittered(self.interval)
+        self.failures += 1
+        backoff = min(self.max_backoff, self.retry_delay * 2 ** (self.failures - 1))
+        return self._jittered(backoff)
@@ -1,153 +1,156 @@
-import asyncio
-from ourgroceries import OurGroceries
-import datetime
-import json
+"""
+Command line helper for trying things against an OurGroceries account with the same
+code the skill uses. Nothing happens when this module is imported, run it as a script:
+
+    python talk_to_ourgroceries.py --user me@example.com lists
+    python talk_to_ourgroceries.py --user me@example.com --list Groceries show
+    python talk_to_ourgroceries.py --user me@example.com --list Groceries add milk --category dairy
+    python talk_to_ourgroceries.py --user me@example.com --list Groceries add-category Snacks
+    python talk_to_ourgroceries.py --user me@example.com --list Groceries uncross-all
+
+The password is read from the OURGROCERIES_PASSWORD environment variable or asked for
+"""
+import argparse
+import getpass
 import os
+import sys
+import time
+
+from grocery_core.bulk_operations import crossed_off_items, run_bulk, uncross_operation
+from grocery_core.category_resolver import CategoryResolver
+from grocery_core.list_directory import ListDirectory
+from grocery_core.session import GrocerySession
+from grocery_core.state_store import read_state, write_state
 
-USERNAME = "groceries"
-PASSWORD = ""
-OG = OurGroceries(USERNAME, PASSWORD)
-asyncio.run(OG.login())
-MY_LIST_ID = "a1kD7kvcMPnzr9del8XMFc"
-CURRENT_TIME = datetime.datetime.now()
 TIME_HEADING_IN_DICT = 'refresh_date'
-GROCERY_STATE_FILE = "ourgroceries.txt"
+GROCERY_STATE_FILE = "ourgroceries_%s.txt"
 CATEGORY_STATE_FILE = "categories.txt"
-bla = asyncio.run(OG.get_my_lists())
-for shopping_list in bla['shoppingLists']:
-    print(shopping_list['name'])
-print("")
+MAX_AGE_MINUTES = 10
+
 
-def fetch_list_and_categories(object_type=None):
+def fetch_list_and_categories(session, client, list_id, object_type=None):
     if object_type == "groceries":
-        list_to_return = asyncio.run(OG.get_list_items(list_id=MY_LIST_ID))
+        list_to_return = session.run(client.get_list_items(list_id=list_id))
     elif object_type == "categories":
-        list_to_return = asyncio.run(OG.get_category_items())
+        list_to_return = session.run(client.get_category_items())
     else:
         list_to_return = None
-    return (list_to_return)
-
-
-def write_new_list_to_disk(state_file, new_list):
-    with open(state_file, 'w') as f:
-        json.dump(new_list, f)
-
-
-def check_file_age(state_file, current_timestamp, object_type=None):
-    if os.path.isfile(state_file):
-        temp_list = json.load(open(state_file))
-        try:
-            last_refresh = temp_list[TIME_HEADING_IN_DICT]
-            minutes_since_last_refresh = round((current_timestamp - last_refresh) / 60)
-        except KeyError:
-            pass
-        if minutes_since_last_refresh > 10:
-            print("Updating %s list as it is older than 10 minutes" % object_type)
-            full_list = fetch_list_and_categories(object_type=object_type)
-            full_list[TIME_HEADING_IN_DICT] = current_timestamp
-            write_new_list_to_disk(state_file, full_list)
-        else:
-            print("%s list under 10 minutes old... skipping refresh" % object_type)
-            full_list = temp_list
-    else:
-        full_list = fetch_list_and_categories(object_type=object_type)
-        full_list[TIME_HEADING_IN_DICT] = current_timestamp
-        write_new_list_to_disk(state_file, full_list)
-    return(full_list)
+    return list_to_return
+
 
+def check_file_age(session, client, list_id, state_file, object_type=None):
+    current_timestamp = time.time()
+    full_list = read_state(state_file)
+    if full_list is not None:
+        minutes_since_last_refresh = (current_timestamp - full_list.get(TIME_HEADING_IN_DICT, 0)) / 60
+        if minutes_since_last_refresh <= MAX_AGE_MINUTES:
+            print("%s list under %s minutes old... skipping refresh" % (object_type, MAX_AGE_MINUTES))
+            return full_list
+        print("Updating %s list as it is older than %s minutes" % (object_type, MAX_AGE_MINUTES))
+    full_list = fetch_list_and_categories(session, client, list_id, object_type=object_type)
+    full_list[TIME_HEADING_IN_DICT] = current_timestamp
+    write_state(state_file, full_list)
+    return full_list
 
-def refresh_lists(override=None):
-    current_timestamp = CURRENT_TIME.timestamp()
+
+def refresh_lists(session, client, list_id, override=None):
     if override is None:
-        grocery_list = check_file_age(GROCERY_STATE_FILE, current_timestamp, object_type="groceries")
-        all_categories = check_file_age(CATEGORY_STATE_FILE, current_timestamp, object_type="categories")
+        grocery_list = check_file_age(session, client, list_id, GROCERY_STATE_FILE % list_id, "groceries")
+        all_categories = check_file_age(session, client, list_id, CATEGORY_STATE_FILE, "categories")
     else:
-        grocery_list = fetch_list_and_categories(object_type="groceries")
-        all_categories = fetch_list_and_categories(object_type="categories")
-    return(grocery_list, all_categories)
+        grocery_list, all_categories = session.run_all([client.get_list_items(list_id=list_id),
+                                                        client.get_category_items()])
+    return grocery_list, all_categories
 
 
 def return_category_id(category_to_search_for, all_categories):
-    category_to_search_for_lower = category_to_search_for.lower()
-    category_id = None
-    if len(all_categories['list']['items']) is not 0:
-        for category_heading in all_categories['list']['items']:
-            # Split the heading because if there is already a duplicate it
-            # presents as "{{item}} (2)"
-            category_heading_lowered = category_heading['value'].lower().split()[0]
-            if category_to_search_for_lower == category_heading_lowered:
-                category_id = category_heading['id']
-                break
-            # attempt to compensate for plurals in categories
-            elif category_to_search_for_lower + 's' == category_heading_lowered:
-                category_id = category_heading['id']
-                break
-            elif category_to_search_for_lower + 'ies' == category_heading_lowered:
-                category_id = category_heading['id']
-                break
-            # If we assume that the last character is a plural 'S', slice it off
-            # and check to see if the heading is the same
-            elif category_to_search_for_lower[:-1] == category_heading_lowered:
-                category_id = category_heading['id']
-                break
-            # Assume the last 3 characters are 'ies' and remove them
-            elif category_to_search_for_lower[:-3] == category_heading_lowered:
-                category_id = category_heading['id']
-                break
-    return(category_id)
-
-
-def add_to_my_list(full_list, item_name, all_categories, category="uncategorized"):
-    # check to make sure the object doesn't exist
-    # The groceries live in my_full_list['list']['items']
-    # Start with the assumption that the food does not exist
-    food_exists = False
-    toggle_crossed_off = False
-    category_lowered = category.lower()
-    for food_item in full_list['list']['items']:
-        if item_name in food_item['value']:
-            print("Already exists")
-            try:
-                if food_item['crossedOff']:
-                    print("Returning crossed off item to list")
-                    existing_item_id = food_item['id']
-                    toggle_crossed_off = True
-            except KeyError:
-                pass
-            food_exists = True
-    if not food_exists:
-        category_id = return_category_id(category_lowered, all_categories)
-        asyncio.run(OG.add_item_to_list(MY_LIST_ID, item_name, category_id))
-        print("Added item")
-    else:
-        if toggle_crossed_off:
-            asyncio.run(OG.toggle_item_crossed_off(MY_LIST_ID, existing_item_id, cross_off=False))
+    return CategoryResolver(all_categories, fuzzy=False).resolve(category_to_search_for)
 
 
-def add_category(category_name, all_categories):
-    category_id = return_category_id(category_name, all_categories)
+def add_to_my_list(session, client, list_id, full_list, item_name, all_categories, category="uncategorized"):
+    # The groceries live in my_full_list['list']['items']
+    for food_item in full_list['list']['items']:
+        if item_name.lower() == food_item['value'].lower():
+            if food_item.get('crossedOff'):
+                print("Returning crossed off item to list")
+                session.run(client.toggle_item_crossed_off(list_id, food_item['id'], cross_off=False))
+            else:
+                print("Already exists")
+            return
+    category_id = return_category_id(category.lower(), all_categories)
+    session.run(client.add_item_to_list(list_id, item_name, category_id))
+    print("Added item")
+
+
+def add_category(session, client, category_name, all_categories):
+    category_id = return_category_id(category_name.lower(), all_categories)
     if category_id is None:
-        asyncio.run(OG.create_category(category_name))
-        refresh_lists()
+        session.run(client.create_category(category_name))
+        # The cached categories don't have the new one yet
+        if os.path.exists(CATEGORY_STATE_FILE):
+            os.remove(CATEGORY_STATE_FILE)
         print("Added Category")
     else:
         print("Category already exists")
 
 
-def uncross_all_items(full_list):
-    for food_item in full_list['list']['items']:
-        try:
-            if food_item['crossedOff']:
-                print("Returning %s to list" % food_item['value'])
-                asyncio.run(OG.toggle_item_crossed_off(MY_LIST_ID, food_item['id'], cross_off=False))
-        except KeyError:
-            pass
-
-my_full_list, current_categories = refresh_lists(override=True)
-
-#add_category("Funnies-1ups", current_categories)
-
-# Need to refresh the list if you are going to add an item to a newly created list
-#add_to_my_list(my_full_list, "comsics2", current_categories, category="Funnies-onesies")
-
-uncross_all_items(my_full_list)
+def uncross_all_items(session, client, list_id, full_list):
+    # The items are sent side by side, a few at a time, instead of one after another
+    items = crossed_off_items(full_list)
+    result = session.run(run_bulk(items, uncross_operation(client, list_id),
+                                  progress=lambda done, total: print("Returned %s of %s items" % (done, total))))
+    for food_item in result.failed:
+        print("Could not return %s to list" % food_item['value'])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Talk to OurGroceries from the command line")
+    parser.add_argument("--user", required=True, help="the OurGroceries account (email address)")
+    parser.add_argument("--list", help="the shopping list to work on, e.g. Groceries")
+    parser.add_argument("--refresh", action="store_true", help="ignore the cached copies of the lists")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("lists", help="print the names of all shopping lists")
+    commands.add_parser("show", help="print the items on the list")
+    add = commands.add_parser("add", help="add an item to the list")
+    add.add_argument("item")
+    add.add_argument("--category", default="uncategorized")
+    new_category = commands.add_parser("add-category", help="create a category")
+    new_category.add_argument("name")
+    commands.add_parser("uncross-all", help="put every crossed off item back on the list")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    password = os.environ.get("OURGROCERIES_PASSWORD") or getpass.getpass("OurGroceries password: ")
+    # Every call below runs on the session's single background event loop
+    session = GrocerySession()
+    try:
+        client = session.connect(args.user, password)
+        my_lists = session.run(client.get_my_lists())
+        if args.command == "lists":
+            for shopping_list in my_lists['shoppingLists']:
+                print(shopping_list['name'])
+            return 0
+        list_id = ListDirectory(my_lists).find(args.list or "")
+        if list_id is None:
+            print("There is no list called %s" % args.list)
+            return 1
+        override = True if args.refresh else None
+        full_list, all_categories = refresh_lists(session, client, list_id, override=override)
+        if args.command == "show":
+            for food_item in full_list['list']['items']:
+                print("%s%s" % (food_item['value'], " (crossed off)" if food_item.get('crossedOff') else ""))
+        elif args.command == "add":
+            add_to_my_list(session, client, list_id, full_list, args.item, all_categories, category=args.category)
+        elif args.command == "add-category":
+            add_category(session, client, args.name, all_categories)
+        elif args.command == "uncross-all":
+            uncross_all_items(session, client, list_id, full_list)
+        return 0
+    finally:
+        session.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
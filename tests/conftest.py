@@ -0,0 +1,110 @@
+"""
+A local HTTP stand in for www.ourgroceries.com. It serves the sign in page, the page
+the team id is read from and the json api on localhost, backed by the FakeBackend the
+benchmarks use, so the real client code (cookies, redirects, status codes and the
+pooled aiohttp session) is what gets tested
+"""
+import os
+import sys
+
+import pytest
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import ourgroceries  # noqa: E402
+
+import grocery_core.client  # noqa: E402
+from fake_ourgroceries import CATEGORY_LIST_ID, FakeBackend  # noqa: E402
+from grocery_core.client import SessionExpiredException  # noqa: E402
+from grocery_core.event_loop import EventLoopThread  # noqa: E402
+from grocery_core.request_gate import RateLimitedException  # noqa: E402
+from grocery_core.session import GrocerySession  # noqa: E402
+
+COOKIE = ourgroceries.COOKIE_KEY_SESSION
+
+
+class FakeOurGroceriesServer(object):
+    """
+    Answers over HTTP the way OurGroceries does: an unknown or expired cookie is
+    redirected to the sign in page, a rate limit is a 429 with Retry-After and a
+    dropped connection on the backend is a 503
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.loop_thread = EventLoopThread(name="fake-ourgroceries-server")
+        self.runner = None
+        self.base_url = None
+        self.retry_after = "1"
+        self.statuses = {}
+
+    async def sign_in(self, request):
+        await request.post()
+        response = web.Response(text="signed in")
+        response.set_cookie(COOKIE, await self.backend.login())
+        return response
+
+    async def your_lists_page(self, request):
+        return web.Response(text='g_teamId = "fake-team";\ng_categoryListId = "%s";' % CATEGORY_LIST_ID,
+                            content_type="text/html")
+
+    async def api(self, request):
+        try:
+            response = web.json_response(await self.backend.handle(request.cookies.get(COOKIE),
+                                                                   await request.json()))
+        except SessionExpiredException:
+            response = web.Response(status=302, headers={'Location': "/sign-in"})
+        except RateLimitedException:
+            response = web.Response(status=429, text="slow down", headers={'Retry-After': self.retry_after})
+        except ConnectionError:
+            response = web.Response(status=503, text="<html>unavailable</html>", content_type="text/html")
+        self.statuses[response.status] = self.statuses.get(response.status, 0) + 1
+        return response
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_post("/sign-in", self.sign_in)
+        app.router.add_get("/your-lists/", self.your_lists_page)
+        app.router.add_post("/your-lists/", self.api)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "localhost", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        # localhost rather than 127.0.0.1, aiohttp's cookie jar ignores cookies from IP addresses
+        return "http://localhost:%s" % port
+
+    def start(self):
+        self.base_url = self.loop_thread.run(self._start())
+        return self.base_url
+
+    def stop(self):
+        self.loop_thread.run(self.runner.cleanup())
+        self.loop_thread.stop()
+
+
+@pytest.fixture
+def backend():
+    return FakeBackend()
+
+
+@pytest.fixture
+def server(backend, monkeypatch):
+    fake_server = FakeOurGroceriesServer(backend)
+    base_url = fake_server.start()
+    # The library and the client read these when they make a request
+    monkeypatch.setattr(ourgroceries, "BASE_URL", base_url)
+    monkeypatch.setattr(ourgroceries, "SIGN_IN", base_url + "/sign-in")
+    monkeypatch.setattr(ourgroceries, "YOUR_LISTS", base_url + "/your-lists/")
+    monkeypatch.setattr(grocery_core.client, "YOUR_LISTS", base_url + "/your-lists/")
+    yield fake_server
+    fake_server.stop()
+
+
+@pytest.fixture
+def session(server):
+    grocery_session = GrocerySession()
+    yield grocery_session
+    grocery_session.close()
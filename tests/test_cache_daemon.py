@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from fake_ourgroceries import FakeBackend, client_factory
+from grocery_core.cache_daemon import CacheDaemon, DaemonClient, is_loopback, parse_args
+
+
+@pytest.mark.parametrize("host", ["127.0.0.1", "localhost", "::1", "[::1]"])
+def test_loopback_hosts(host):
+    assert is_loopback(host)
+
+
+@pytest.mark.parametrize("host", ["0.0.0.0", "192.168.1.10", "::", "my-laptop"])
+def test_other_hosts(host):
+    assert not is_loopback(host)
+
+
+def test_refuses_to_listen_on_the_network():
+    daemon = CacheDaemon(client=None)
+    with pytest.raises(ValueError):
+        asyncio.run(daemon.serve("0.0.0.0:8765"))
+    with pytest.raises(SystemExit):
+        parse_args(["--user", "me", "--socket", "0.0.0.0:8765"])
+
+
+def test_changes_are_pushed_to_other_skills(tmp_path):
+    backend = FakeBackend()
+    list_id = backend.add_list("Groceries", [("milk", None, False)])
+    address = str(tmp_path / "daemon.sock")
+    invalidated = []
+
+    async def scenario():
+        client = client_factory(backend)("user", "password")
+        await client.login()
+        server = asyncio.ensure_future(CacheDaemon(client).serve(address))
+        await asyncio.sleep(0.1)
+        writer = DaemonClient(address)
+        reader = DaemonClient(address, on_invalidate=invalidated.append)
+        try:
+            await reader.get_list_items(list_id=list_id)
+            requests = backend.requests
+            # A second skill gets the list from the daemon's memory
+            await writer.get_list_items(list_id=list_id)
+            assert backend.requests == requests
+            await writer.add_item_to_list(list_id, "eggs")
+            await asyncio.sleep(0.1)
+            full_list = await reader.get_list_items(list_id=list_id)
+            return [item['value'] for item in full_list['list']['items']]
+        finally:
+            await writer.close()
+            await reader.close()
+            server.cancel()
+
+    assert asyncio.run(scenario()) == ["milk", "eggs"]
+    assert invalidated == [["groceries:%s" % list_id]]
@@ -0,0 +1,49 @@
+from grocery_core.category_resolver import CategoryResolver, edit_distance
+
+
+def resolver(*headings):
+    return CategoryResolver({'list': {'items': [{'id': "cat%s" % number, 'value': heading}
+                                                for number, heading in enumerate(headings)]}})
+
+
+def test_plural_headings():
+    category_resolver = resolver("Vegetables", "Canned Goods")
+    assert category_resolver.resolve("vegetable") == "cat0"
+    assert category_resolver.resolve("Vegetables") == "cat0"
+    assert category_resolver.resolve("canned") == "cat1"
+
+
+def test_ies_headings():
+    category_resolver = resolver("Dairies", "Candy")
+    assert category_resolver.resolve("dairy") == "cat0"
+    assert category_resolver.resolve("candies") == "cat1"
+
+
+def test_duplicate_suffix():
+    category_resolver = resolver("Produce (2)", "Produce")
+    # The first heading wins, as it did before the resolver
+    assert category_resolver.resolve("produce") == "cat0"
+    assert resolver("Bakery (3)").resolve("bakery") == "cat0"
+
+
+def test_misheard_categories():
+    category_resolver = resolver("Dairy", "Frozen Foods", "Beverages")
+    assert category_resolver.resolve("dairu") == "cat0"
+    assert category_resolver.resolve("frozne") == "cat1"
+    # The first letter is as likely to be misheard as any other
+    assert category_resolver.resolve("fairy") == "cat0"
+    assert category_resolver.resolve("peverages") == "cat2"
+    assert category_resolver.resolve("hardware") is None
+
+
+def test_fuzzy_can_be_turned_off():
+    category_resolver = resolver("Dairy")
+    assert category_resolver.resolve("dairu", fuzzy=False) is None
+    assert CategoryResolver(category_resolver.all_categories, fuzzy=False).resolve("dairu") is None
+
+
+def test_edit_distance():
+    assert edit_distance("dairy", "dairy", 2) == 0
+    assert edit_distance("diary", "dairy", 2) == 2
+    assert edit_distance("dairy", "hardware", 2) == 3
+    assert edit_distance("beverage", "bverages", 1) == 2
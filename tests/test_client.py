@@ -0,0 +1,73 @@
+import aiohttp
+import pytest
+
+from grocery_core.request_gate import RateLimitedException
+
+
+def test_one_login_for_many_connects(session, backend):
+    list_id = backend.add_list("Groceries", [("milk", None, False)])
+    for _ in range(5):
+        client = session.connect("user", "password")
+        session.run(client.get_list_items(list_id=list_id))
+    assert backend.logins == 1
+    assert session.stats()['logins_avoided'] == 4
+
+
+def test_logs_in_again_when_the_cookie_expires(session, backend, server):
+    backend.session_lifetime = 1
+    list_id = backend.add_list("Groceries", [("milk", None, False)])
+    client = session.connect("user", "password")
+    session.run(client.get_list_items(list_id=list_id))
+    full_list = session.run(client.get_list_items(list_id=list_id))
+    assert full_list['list']['items'][0]['value'] == "milk"
+    assert server.statuses[302] == 1
+    assert backend.logins == 2
+    assert client.relogin_count == 1
+
+
+def test_crossed_off_flags_survive(session, backend):
+    list_id = backend.add_list("Groceries", [("milk", None, True), ("eggs", None, False)])
+    client = session.connect("user", "password")
+    items = session.run(client.get_list_items(list_id=list_id))['list']['items']
+    assert [item['crossedOff'] for item in items] == [True, False]
+
+
+def test_rate_limit_raises_with_retry_after(session, backend):
+    session.gate.cooldown = 0
+    client = session.connect("user", "password")
+    backend.rate_limits_pending = 1
+    with pytest.raises(RateLimitedException) as error:
+        session.run(client.get_my_lists())
+    assert error.value.retry_after == 1.0
+    assert session.gate.rate_limited == 1
+
+
+def test_rate_limited_read_answered_from_last_response(session, backend, server):
+    server.retry_after = "0"
+    list_id = backend.add_list("Groceries", [("milk", None, False)])
+    client = session.connect("user", "password")
+    first = session.run(client.get_list_items(list_id=list_id))
+    backend.rate_limits_pending = 1
+    second = session.run(client.get_list_items(list_id=list_id))
+    assert second == first
+    assert session.gate.served_stale == 1
+
+
+def test_server_error_is_not_a_expired_session(session, backend):
+    client = session.connect("user", "password")
+    backend.failures_pending = 1
+    with pytest.raises(aiohttp.ClientResponseError):
+        session.run(client.get_my_lists())
+    assert backend.logins == 1
+    assert client.relogin_count == 0
+
+
+def test_login_that_times_out_is_tried_again(session, backend):
+    backend.latency = 0.5
+    with pytest.raises(TimeoutError):
+        session.connect("user", "password", timeout=0.05)
+    assert session.client is None
+    backend.latency = 0
+    client = session.connect("user", "password", timeout=5)
+    assert session.run(client.get_my_lists()) is not None
+    assert session.logins_avoided == 0
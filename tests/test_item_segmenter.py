@@ -0,0 +1,41 @@
+from grocery_core.item_segmenter import ItemSegmenter
+
+
+def segmenter(*names):
+    item_segmenter = ItemSegmenter()
+    for name in names:
+        item_segmenter.learn(name)
+    return item_segmenter
+
+
+def test_longest_known_name_wins():
+    item_segmenter = segmenter("peanut", "peanut butter", "peanut butter cups", "ice cream")
+    assert item_segmenter.segment("peanut butter ice cream milk") == ["peanut butter", "ice cream", "milk"]
+    assert item_segmenter.segment("Peanut Butter Cups and peanut") == ["Peanut Butter Cups", "peanut"]
+
+
+def test_known_name_containing_a_connector_stays_whole():
+    item_segmenter = segmenter("half and half")
+    assert item_segmenter.segment("eggs, half and half and bread") == ["eggs", "half and half", "bread"]
+
+
+def test_connectors_alone_are_dropped():
+    item_segmenter = segmenter("milk")
+    assert item_segmenter.segment("milk and then eggs") == ["milk", "eggs"]
+    assert item_segmenter.segment("and") == []
+
+
+def test_learn_list_only_reads_new_items():
+    full_list = {'list': {'id': 'list1', 'versionId': 'v1', 'items': [{'value': "ice cream"}]}}
+    item_segmenter = ItemSegmenter()
+    item_segmenter.learn_list(full_list)
+    assert len(item_segmenter) == 1
+    full_list['list']['items'].append({'value': "peanut butter"})
+    learnt = []
+    item_segmenter.learn = learnt.append
+    item_segmenter.learn_list(full_list)
+    assert learnt == ["peanut butter"]
+    # A new version of the list is read again from the start
+    full_list['list']['versionId'] = 'v2'
+    item_segmenter.learn_list(full_list)
+    assert learnt == ["peanut butter", "ice cream", "peanut butter"]
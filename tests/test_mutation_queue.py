@@ -0,0 +1,60 @@
+import time
+
+from grocery_core.event_loop import EventLoopThread
+from grocery_core.mutation_queue import ADD_ITEM, MutationQueue
+
+
+def wait_until_empty(queue, timeout=10):
+    deadline = time.time() + timeout
+    while len(queue) and time.time() < deadline:
+        time.sleep(0.01)
+    return len(queue) == 0
+
+
+def test_retries_after_failures(session, backend, tmp_path):
+    list_id = backend.add_list("Groceries")
+    session.connect("user", "password")
+    queue = MutationQueue(str(tmp_path / "pending.txt"), retry_delay=0.05)
+    backend.failures_pending = 2
+    queue.enqueue(list_id, ADD_ITEM, value="milk", category_id=None)
+    queue.start(session.loop_thread, lambda: session.client)
+    try:
+        assert wait_until_empty(queue)
+    finally:
+        queue.stop()
+    assert [item['value'] for item in backend.lists[list_id]['items']] == ["milk"]
+    assert queue.failures == 2
+    assert queue.sent == 1
+
+
+def test_kept_on_disk_until_sent(tmp_path):
+    path = str(tmp_path / "pending.txt")
+    MutationQueue(path).enqueue("list1", ADD_ITEM, value="milk", category_id=None)
+    assert len(MutationQueue(path)) == 1
+
+
+def test_batch_is_saved_once(tmp_path):
+    queue = MutationQueue(str(tmp_path / "pending.txt"))
+    queue.enqueue_many([("list1", ADD_ITEM, {'value': name, 'category_id': None}) for name in "abcde"])
+    assert len(queue) == 5
+    assert queue.bytes_written == (tmp_path / "pending.txt").stat().st_size
+
+
+def test_new_category_replaces_waiting_add(tmp_path):
+    queue = MutationQueue(str(tmp_path / "pending.txt"))
+    assert queue.enqueue("list1", ADD_ITEM, value="milk", category_id="dairy")
+    assert queue.enqueue("list1", ADD_ITEM, value="Milk", category_id="produce")
+    assert not queue.enqueue("list1", ADD_ITEM, value="Milk", category_id="produce")
+    assert [mutation['args']['category_id'] for mutation in queue.pending] == ["produce"]
+
+
+def test_waits_quietly_without_a_client(tmp_path):
+    queue = MutationQueue(str(tmp_path / "pending.txt"))
+    queue.enqueue("list1", ADD_ITEM, value="milk", category_id=None)
+    loop_thread = EventLoopThread()
+    started = time.process_time()
+    queue.start(loop_thread, lambda: None)
+    time.sleep(0.5)
+    queue.stop()
+    loop_thread.stop()
+    assert time.process_time() - started < 0.2
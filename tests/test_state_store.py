@@ -0,0 +1,74 @@
+import os
+import threading
+
+from grocery_core.journal import add_record
+from grocery_core.mutation_queue import ADD_ITEM, MutationQueue
+from grocery_core.state_cache import EXPIRED, StateCache
+
+
+def full_list(count):
+    return {'list': {'id': 'list1', 'versionId': 'v1',
+                     'items': [{'id': str(number), 'value': "item %s" % number} for number in range(count)]}}
+
+
+def test_no_files_left_behind(tmp_path):
+    state_file = str(tmp_path / "groceries_list1.txt")
+    cache = StateCache()
+    data = full_list(3)
+    cache.store(state_file, "groceries", data)
+    data['list']['items'].append({'value': "milk"})
+    cache.append(state_file, "groceries", data, [{'op': 'add', 'value': "milk"}])
+    MutationQueue(str(tmp_path / "pending_changes.txt")).enqueue("list1", ADD_ITEM, value="milk")
+    assert sorted(os.listdir(str(tmp_path))) == ["groceries_list1.txt", "groceries_list1.txt.journal",
+                                                 "pending_changes.txt"]
+    cache.invalidate(state_file)
+    assert os.listdir(str(tmp_path)) == ["pending_changes.txt"]
+
+
+def test_writers_take_turns(tmp_path):
+    state_file = str(tmp_path / "groceries_list1.txt")
+
+    def write(count):
+        for _ in range(20):
+            # A cache each, like separate processes sharing the state file
+            StateCache().store(state_file, "groceries", full_list(count))
+
+    threads = [threading.Thread(target=write, args=(count,)) for count in (10, 20, 30)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(StateCache().load(state_file, "groceries")['list']['items']) in (10, 20, 30)
+
+
+def test_append_after_a_refresh_keeps_the_refreshed_list(tmp_path):
+    state_file = str(tmp_path / "groceries_list1.txt")
+    cache = StateCache()
+    cache.store(state_file, "groceries", full_list(3))
+    held = cache.load(state_file, "groceries")
+
+    def refreshed(current):
+        fresh = full_list(4)
+        fresh['list']['versionId'] = 'v2'
+        return fresh
+    cache.update(state_file, "groceries", refreshed)
+    # An intent still holding the old copy adds to it
+    held['list']['items'].append({'value': "milk"})
+    cache.append(state_file, "groceries", held, [add_record("milk", None)])
+    for data in (cache.load(state_file, "groceries"), StateCache().load(state_file, "groceries")):
+        assert data['list']['versionId'] == 'v2'
+        assert [item['value'] for item in data['list']['items']][-2:] == ["item 3", "milk"]
+
+
+def test_expired_list_kept_for_offline_use(tmp_path):
+    state_file = str(tmp_path / "groceries_list1.txt")
+    cache = StateCache()
+    data = full_list(3)
+    data['refresh_date'] = cache.now()
+    cache.store(state_file, "groceries", data)
+    data['list']['items'].append({'value': "milk"})
+    cache.append(state_file, "groceries", data, [add_record("milk", None)])
+    cache.expire(state_file, "groceries")
+    for kept in (cache.load(state_file, "groceries"), StateCache().load(state_file, "groceries")):
+        assert cache.freshness(kept, "groceries") == EXPIRED
+        assert [item['value'] for item in kept['list']['items']][-1] == "milk"
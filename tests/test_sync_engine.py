@@ -0,0 +1,90 @@
+from fake_ourgroceries import client_factory
+from grocery_core.item_index import GroceryIndex
+from grocery_core.sync_engine import SyncEngine, merge_list
+
+
+def shopping_list(version, items):
+    return {'list': {'id': 'list1', 'versionId': version,
+                     'items': [dict(item_id and {'id': item_id} or {}, value=value) for item_id, value in items]}}
+
+
+def values(full_list):
+    return [item['value'] for item in full_list['list']['items']]
+
+
+def test_local_item_kept_until_the_server_has_it():
+    cached = shopping_list('v1', [("1", "milk"), (None, "eggs")])
+    merge_list(cached, shopping_list('v2', [("1", "milk"), ("2", "bread")]))
+    # The add of eggs has not reached OurGroceries yet
+    assert values(cached) == ["milk", "eggs", "bread"]
+    merge_list(cached, shopping_list('v3', [("1", "milk"), ("2", "bread"), ("3", "Eggs")]))
+    assert values(cached) == ["milk", "bread", "Eggs"]
+    assert cached['list']['items'][2]['id'] == "3"
+    assert cached['list']['versionId'] == 'v3'
+
+
+def test_index_extended_when_items_are_only_added():
+    cached = shopping_list('v1', [("1", "milk")])
+    milk = cached['list']['items'][0]
+    index = GroceryIndex(cached)
+    positions = index.positions
+    assert merge_list(cached, shopping_list('v2', [("1", "milk"), ("2", "bread")]), index) == (1, 0, 0)
+    # The unchanged item and the index over it are left alone
+    assert cached['list']['items'][0] is milk
+    assert index.positions is positions
+    assert index.is_for(cached)
+    assert index.find("bread")['id'] == "2"
+
+
+def test_index_rebuilt_when_items_are_removed():
+    cached = shopping_list('v1', [("1", "milk"), ("2", "bread"), ("3", "eggs")])
+    index = GroceryIndex(cached)
+    assert merge_list(cached, shopping_list('v2', [("1", "milk"), ("3", "eggs")]), index) == (0, 0, 1)
+    assert index.is_for(cached)
+    assert index.find("bread") is None
+    assert index.find("eggs")['id'] == "3"
+
+
+def test_unchanged_list_is_not_downloaded(session, backend):
+    list_id = backend.add_list("Groceries", [("milk", None, False)])
+    client = session.connect("user", "password")
+    engine = SyncEngine(gate=session.gate)
+    cached = session.run(client.get_list_items(list_id=list_id))
+    assert session.run(engine.fetch_changes(client, list_id, cached)) is None
+    assert (engine.downloads, engine.skipped) == (0, 1)
+    # Another device changes the list
+    other_device = client_factory(backend)("user", "password")
+    session.run(other_device.login())
+    session.run(other_device.add_item_to_list(list_id, "eggs"))
+    fresh = session.run(engine.fetch_changes(client, list_id, cached))
+    assert values(fresh) == ["milk", "eggs"]
+    assert (engine.downloads, engine.skipped) == (1, 1)
+
+
+def test_lists_synced_together_share_one_overview(session, backend):
+    first = backend.add_list("Groceries", [("milk", None, False)])
+    second = backend.add_list("Hardware", [("nails", None, False)])
+    client = session.connect("user", "password")
+    engine = SyncEngine(gate=session.gate)
+    cached = [session.run(client.get_list_items(list_id=list_id)) for list_id in (first, second)]
+    results = session.run_all([engine.fetch_changes(client, first, cached[0]),
+                               engine.fetch_changes(client, second, cached[1])])
+    assert results == [None, None]
+    assert engine.overview_requests == 1
+    # A later sync asks again rather than trusting the overview from before it started
+    assert session.run(engine.fetch_changes(client, first, cached[0])) is None
+    assert engine.overview_requests == 2
+
+
+def test_overview_dropped_after_a_write(session, backend):
+    list_id = backend.add_list("Groceries", [("milk", None, False)])
+    client = session.connect("user", "password")
+    engine = SyncEngine(overview_max_age=60, gate=session.gate)
+    cached = session.run(client.get_list_items(list_id=list_id))
+    assert session.run(engine.fetch_changes(client, list_id, cached)) is None
+    assert session.run(engine.fetch_changes(client, list_id, cached)) is None
+    assert engine.overview_requests == 1
+    session.run(client.add_item_to_list(list_id, "eggs"))
+    fresh = session.run(engine.fetch_changes(client, list_id, cached))
+    assert [item['value'] for item in fresh['list']['items']] == ["milk", "eggs"]
+    assert engine.overview_requests == 2